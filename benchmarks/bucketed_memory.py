@@ -0,0 +1,63 @@
+"""Compares the redis memory use of the key layouts
+
+Awards points in two point systems and a badge to a number of users
+using each layout and reports the used_memory growth. The database is
+flushed between runs, so point it at a scratch redis database:
+
+    python benchmarks/bucketed_memory.py --db 15 --users 100000
+"""
+from __future__ import (with_statement, print_function,
+                        division, absolute_import)
+import argparse
+
+import redis
+
+from operant.storage.plain_redis import Redis
+from operant.point import PointSystem
+
+
+class _Badge(object):
+    badge_id = "bench"
+
+
+def _used_memory(client):
+    return client.info("memory")["used_memory"]
+
+
+def run(client, users, **kwargs):
+    client.flushdb()
+    # Event logs would dominate, keep them small
+    store = Redis(client, max_events=1, max_user_events=1,
+                  chunk_size=5000, **kwargs)
+    before = _used_memory(client)
+    for points in (PointSystem("xp"), PointSystem("gold")):
+        store.add_points_many([(uid, 1) for uid in range(users)],
+                              points, lambda res: None)
+    store.add_badge_many(list(range(users)), _Badge(), lambda res: None)
+    client.delete(*store.global_event_keys())
+    client.delete(*["events:{0}".format(uid) for uid in range(users)])
+    used = _used_memory(client) - before
+    client.flushdb()
+    return used
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=6379)
+    parser.add_argument("--db", type=int, default=15)
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--bucket-size", type=int, default=32)
+    args = parser.parse_args()
+
+    client = redis.StrictRedis(host=args.host, port=args.port, db=args.db)
+    keys = run(client, args.users)
+    bucketed = run(client, args.users, layout="bucketed",
+                   bucket_size=args.bucket_size)
+    print("keys:     {0:>12} bytes, {1:.1f} per user"
+          .format(keys, keys / args.users))
+    print("bucketed: {0:>12} bytes, {1:.1f} per user"
+          .format(bucketed, bucketed / args.users))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""Compares the per-call cost of Combined with its compiled function
+
+Times calling a Combined of a fixed ratio, a variable ratio and a
+fixed interval schedule, consuming the lazy result, against calling
+the function returned by compile:
+
+    python benchmarks/combined_call.py --calls 200000
+"""
+from __future__ import (with_statement, print_function,
+                        division, absolute_import)
+import argparse
+import timeit
+
+from operant.schedules import (Combined, FixedRatio, VariableRatio,
+                               FixedInterval)
+
+
+def combined():
+    return Combined(FixedRatio(5), VariableRatio(10), FixedInterval(60))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--calls", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    comb = combined()
+    compiled = comb.compile()
+    cases = (("Combined, keywords",
+              lambda: tuple(comb(current=10, last=0))),
+             ("Combined, positional",
+              lambda: tuple(comb(10, 0))),
+             ("compiled, keywords",
+              lambda: compiled(current=10, last=0)),
+             ("compiled, positional",
+              lambda: compiled(10, 0)))
+
+    print("{0:<24} {1:>10}".format("call", "us/call"))
+    for name, fn in cases:
+        best = min(timeit.repeat(fn, number=args.calls, repeat=args.repeat))
+        print("{0:<24} {1:>10.3f}".format(name, best / args.calls * 1e6))
+
+if __name__ == "__main__":
+    main()
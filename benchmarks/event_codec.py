@@ -0,0 +1,53 @@
+"""Compares the event codecs by CPU time and bytes per event
+
+Encodes and decodes a mix of the events recorded by operant using
+each codec, no redis server is needed:
+
+    python benchmarks/event_codec.py --events 100000
+"""
+from __future__ import (with_statement, print_function,
+                        division, absolute_import)
+import argparse
+import time
+
+from operant.storage.event_codecs import JSONCodec, MsgpackCodec
+
+IDS = ["xp", "gold", "first_login"]
+
+
+def bodies(n):
+    kinds = ["point.awarded.xp", "currency.awarded.gold",
+             "badge.awarded.first_login"]
+    for i in range(n):
+        ext = dict(amount=i % 100) if i % 3 != 2 else {}
+        yield (kinds[i % 3], i, ext)
+
+
+def run(codec, events):
+    items = list(bodies(events))
+    start = time.process_time()
+    encoded = [codec.encode(body) for body in items]
+    encode_time = time.process_time() - start
+    start = time.process_time()
+    for data in encoded:
+        codec.decode(data)
+    decode_time = time.process_time() - start
+    size = sum(len(data) for data in encoded)
+    return (encode_time / events * 1e6, decode_time / events * 1e6,
+            size / events)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--events", type=int, default=100000)
+    args = parser.parse_args()
+
+    print("{0:<8} {1:>12} {2:>12} {3:>12}".format(
+        "codec", "encode (us)", "decode (us)", "bytes"))
+    for name, codec in (("json", JSONCodec()),
+                        ("msgpack", MsgpackCodec(IDS))):
+        print("{0:<8} {1:>12.2f} {2:>12.2f} {3:>12.1f}".format(
+            name, *run(codec, args.events)))
+
+if __name__ == "__main__":
+    main()
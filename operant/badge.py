@@ -2,7 +2,7 @@
 """
 from __future__ import (with_statement, print_function,
                         division, absolute_import)
-from operant.base import Registry
+from operant.base import Registry, awaitable, returns_future, track_award
 
 
 class BadgePrototype(object):
@@ -21,21 +21,43 @@ class BadgePrototype(object):
 
         def cb(success):
             if success:
-                store.track_event("badge.awarded." + self.badge_id,
-                                  user.operant_id())
+                track_award(store, "badge.awarded." + self.badge_id,
+                            user.operant_id())
                 callback(self)
             else:
                 callback(False)
         user_id = user.operant_id()
         store.add_badge(user_id, self, cb)
 
-    def award(self, store, user, callback):
+    @returns_future
+    def award(self, store, user, callback=None):
         """Awards a badge to a user"""
         if self._check_preconditions(user):
             self._add_badge_to_user(store, user, callback)
         else:
             callback(False)
 
+    def award_async(self, store, user):
+        """Awards a badge to a user, returning an awaitable"""
+        return awaitable(self.award, store, user)
+
+    @returns_future
+    def award_many(self, store, users, callback=None):
+        """Awards a badge to many users at once
+
+        The callback is called with a list holding the badge for each
+        user that received it and False for the others.
+        """
+        users = list(users)
+        checks = [self._check_preconditions(user) for user in users]
+
+        def cb(added):
+            added = iter(added)
+            callback([self if ok and next(added) else False
+                      for ok in checks])
+        store.add_badge_many([user.operant_id() for user, ok
+                              in zip(users, checks) if ok], self, cb)
+
 
 Badges = Registry("badge", "badge_id")
 Badges.set_str_handler(BadgePrototype)
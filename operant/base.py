@@ -1,7 +1,101 @@
 """ Bases shared by the different gamification components"""
+import functools
 
 from six import string_types
 
+try:
+    import contextvars
+    _errback = contextvars.ContextVar("operant_errback", default=None)
+except ImportError:
+    _errback = None
+
+
+def current_errback():
+    """Returns the errback of the model call being made, if any
+
+    Storage providers completing calls later, such as the asyncio
+    one, look this up when a call is made and pass the exception to
+    it if the call fails, rather than calling the callback.
+    """
+    if _errback is None:
+        return None
+    return _errback.get()
+
+
+def _call_with_errback(fn, errback, args, kwargs):
+    if errback is None or _errback is None:
+        return fn(*args, **kwargs)
+    token = _errback.set(errback)
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        _errback.reset(token)
+
+
+def _fail(future, e):
+    # Calls made from the callbacks fail after it is resolved
+    if not future.done():
+        future.set_exception(e)
+
+
+def track_award(store, event, *args):
+    """Tracks the event of an award unless the store records it itself
+
+    Takes the arguments of track_event after the store.
+    """
+    if getattr(store, "records_award_events", False) is not True:
+        store.track_event(event, *args)
+
+
+def returns_future(fn):
+    """Lets a method taking a callback be called without one
+
+    Called without a callback, or with None, the method returns a
+    concurrent.futures.Future resolved with the value the callback
+    would have been called with, or failed with the exception raised
+    while making the call or by the storage provider completing it.
+    The future's set_result is used as the callback and a partial as
+    the errback, so no closure is created per call. The callback must be the method's last
+    positional argument. An errback keyword argument may be passed
+    along with a callback to receive the failures instead.
+    """
+    code = fn.__code__
+    pos = code.co_varnames[:code.co_argcount].index("callback")
+
+    @functools.wraps(fn)
+    def _wrapper(*args, **kwargs):
+        if len(args) > pos:
+            callback = args[pos]
+            args = args[:pos]
+        else:
+            callback = kwargs.pop("callback", None)
+        errback = kwargs.pop("errback", None)
+
+        if callback is not None:
+            kwargs["callback"] = callback
+            return _call_with_errback(fn, errback, args, kwargs)
+
+        from concurrent.futures import Future
+        future = Future()
+        fail = functools.partial(_fail, future)
+        kwargs["callback"] = future.set_result
+        try:
+            _call_with_errback(fn, fail, args, kwargs)
+        except Exception as e:
+            fail(e)
+        return future
+    return _wrapper
+
+
+def awaitable(fn, *args, **kwargs):
+    """Calls a method decorated with returns_future as an awaitable
+
+    The awaitable is bound to the event loop of the current thread.
+    """
+    import asyncio
+    return asyncio.wrap_future(fn(*args, **kwargs))
+
+
 class Registry(object):
     """Class providing a collection of named objects.
 
@@ -8,7 +8,7 @@ is redeemable.
 """
 from __future__ import (with_statement, print_function,
                         division, absolute_import)
-from operant.base import Registry
+from operant.base import Registry, awaitable, returns_future, track_award
 
 
 class Currency(object):
@@ -23,26 +23,86 @@ class Currency(object):
     def _deduct_currency_from_user(self, store, user, amount, callback):
         store.deduct_balance(user.operant_id(), self, amount, callback)
 
+    @returns_future
     def award(self, store, user, amount=1, callback=None):
         """Awards the passed in amount of this currency"""
         def _cb(n):
-            store.track_event("currency.awarded." + self.currency_id,
-                              user.operant_id(), dict(amount=amount))
+            track_award(store, "currency.awarded." + self.currency_id,
+                        user.operant_id(), dict(amount=amount))
             callback(n)
         self._add_currency_to_user(store, user, amount, _cb)
 
+    def award_async(self, store, user, amount=1):
+        """Awards currency, returning an awaitable"""
+        return awaitable(self.award, store, user, amount)
+
+    @returns_future
+    def award_many(self, store, awards, callback=None):
+        """Awards this currency to many players at once
+
+        Takes a sequence of (user, amount) pairs, the callback is
+        called with a list of the players' new balances.
+        """
+        store.add_balance_many([(user.operant_id(), amount)
+                                for user, amount in awards], self, callback)
+
+    @returns_future
     def deduct_balance(self, store, user, amount=1, callback=None):
         """Deducts the passed in amount of this currency from the player"""
         def _cb(n):
-            store.track_event("currency.deducted." + self.currency_id,
-                              user.operant_id(), dict(amount=amount))
+            track_award(store, "currency.deducted." + self.currency_id,
+                        user.operant_id(), dict(amount=amount))
             callback(n)
         self._deduct_currency_from_user(store, user, amount, _cb)
 
+    @returns_future
+    def spend(self, store, user, amount=1, callback=None):
+        """Deducts an amount of this currency if the player can afford it
+
+        The callback is called with a (success, balance) tuple, the
+        balance being left untouched when it does not cover the
+        amount. Unlike deduct_balance concurrent spends can not take
+        the balance below zero.
+        """
+        def _cb(res):
+            if res[0]:
+                track_award(store, "currency.deducted." + self.currency_id,
+                            user.operant_id(), dict(amount=amount))
+            callback(res)
+        store.spend_balance(user.operant_id(), self, amount, _cb)
+
+    def spend_async(self, store, user, amount=1):
+        """Spends currency, returning an awaitable"""
+        return awaitable(self.spend, store, user, amount)
+
+    @returns_future
     def get_balance(self, store, user, callback=None):
         """Gets the users balance in the passed  in currency"""
         store.get_balance(user.operant_id(), self, callback)
 
+    def get_balance_async(self, store, user):
+        """Gets the users balance as an awaitable"""
+        return awaitable(self.get_balance, store, user)
+
+
+@returns_future
+def exchange(store, user, pay, receive, callback=None):
+    """Atomically exchanges currencies of a player for other currencies
+
+    pay and receive are sequences of (currency, amount) pairs, listing
+    each currency at most once. Either
+    all of the paid amounts are deducted and the received ones
+    awarded, or, if the player can not afford to pay, nothing
+    changes. The callback is called with a (success, balances) tuple,
+    balances being a dict of the resulting balances by currency id.
+    """
+    store.exchange(user.operant_id(), pay, receive, callback)
+
+
+def exchange_async(store, user, pay, receive):
+    """Exchanges currencies, returning an awaitable"""
+    return awaitable(exchange, store, user, pay, receive)
+
 Currencies = Registry("currency", "currency_id")
 Currencies.set_str_handler(Currency)
 get = Currencies.get
@@ -3,6 +3,13 @@ import zope.interface as interface
 class IStorageProvider(interface.Interface):
     """ Storage provider for operant"""
 
+    records_award_events = interface.Attribute(
+        """Whether add_points, add_balance, deduct_balance,
+        spend_balance and add_badge record the events of the awards
+        themselves. If so the models do not track them, otherwise
+        they call track_event once the award is made. Providers
+        without the attribute are taken not to.""")
+
     def add_badge(self, user, badge, callback):
         """Adds a badge to a user if appropriate.
         
@@ -10,6 +17,14 @@ class IStorageProvider(interface.Interface):
         callback.
         """
 
+    def add_badge_many(self, users, badge, callback):
+        """Adds a badge to many users at once.
+
+        The callback should be called with a list of booleans
+        indicating success, in the order of the users. Implementations
+        track the award events themselves.
+        """
+
     def track_event(self, event, subject=None, ext={}):
         """Tracks the occurance of an event.
 
@@ -36,6 +51,50 @@ class IStorageProvider(interface.Interface):
         post-decrementation.
         """
 
+    def spend_balance(self, user, currency, amount, callback):
+        """Deducts an amount of a currency if the user's balance covers it.
+
+        Checking the balance and deducting from it is atomic, so
+        concurrent spends can not overdraw it. The callback should be
+        called with a two-tuple of a boolean indicating success and
+        the balance post-decrementation, or the unchanged balance if
+        it was too low.
+        """
+
+    def exchange(self, user, pay, receive, callback):
+        """Atomically exchanges currencies of a user for other currencies.
+
+        pay and receive are sequences of (currency, amount) pairs, each
+        currency appearing at most once in each, and ValueError is raised
+        otherwise. The paid amounts are deducted and the received ones added if the
+        user's balances cover all of the paid amounts, otherwise
+        nothing changes. The callback should be called with a
+        two-tuple of a boolean indicating success and a dict of the
+        resulting balances by currency id. Implementations track the
+        currency.exchanged event themselves.
+        """
+
+    def respond_schedule(self, user, key, rule, callback):
+        """Counts a response of a user to a stored reinforcement schedule.
+
+        The state of the schedule is kept per user and key and is
+        updated atomically with evaluating the rule. rule is either
+        ("ratio", reward, nth), counting the response and rewarding
+        every nth, or ("interval", reward, now, threshold, offset),
+        rewarding if at least threshold seconds have passed since the
+        stored time, zero if none is stored, and then storing now plus
+        offset. The callback should be called with the reward or 0.
+        """
+
+    def add_balance_many(self, awards, currency, callback):
+        """Adds to the balance of many users at once.
+
+        Takes a sequence of (user, amount) pairs. The callback should
+        be called with a list of the balances post-incrementation, in
+        the order of the pairs. Implementations track the award events
+        themselves.
+        """
+
     def get_balance(self, user, currency, callback):
         """Gets the balance of the passed in currency
 
@@ -54,3 +113,12 @@ class IStorageProvider(interface.Interface):
         the number of points a player has post-increment or None on
         failure.
         """
+
+    def add_points_many(self, awards, point_system, callback):
+        """Adds points in the given system to many users at once.
+
+        Takes a sequence of (user, amount) pairs. The callback should
+        be called with a list of the point counts post-increment, in
+        the order of the pairs. Implementations track the award events
+        themselves.
+        """
@@ -5,18 +5,81 @@ that they are not exchanged from anything else.
 """
 from __future__ import (with_statement, print_function,
                         division, absolute_import)
-from operant.base import Registry
+import operant.windows
+from operant.base import Registry, awaitable, returns_future, track_award
 
 
-class PointSystem(object):
+class _Ranked(object):
+    """Leaderboard queries shared by point systems and their windows"""
+
+    @returns_future
+    def top(self, store, n, callback=None):
+        """Gets the n players with the most points
+
+        The callback is called with a list of (rank, player id,
+        points) tuples, ranks starting at 0.
+        """
+        store.leaderboard_top(self, n, callback)
+
+    def top_async(self, store, n):
+        """Gets the n players with the most points as an awaitable"""
+        return awaitable(self.top, store, n)
+
+    @returns_future
+    def rank(self, store, user, callback=None):
+        """Gets the rank of a player, None if the player is unranked"""
+        store.leaderboard_rank(user.operant_id(), self, callback)
+
+    def rank_async(self, store, user):
+        """Gets the rank of a player as an awaitable"""
+        return awaitable(self.rank, store, user)
+
+    @returns_future
+    def around(self, store, user, k=5, callback=None):
+        """Gets the k players ranked above and below a player
+
+        The callback is called with a list of tuples as given by top,
+        including the player's own.
+        """
+        store.leaderboard_around(user.operant_id(), self, k, callback)
+
+    def around_async(self, store, user, k=5):
+        """Gets the players ranked around a player as an awaitable"""
+        return awaitable(self.around, store, user, k)
+
+
+class PointSystem(_Ranked):
     """A prototype for a point system.
 
     An instance of a PointSystem represents a type of points such as
     experience or frequenc flyer miles. Derived classes may be used to
     create point systems with different rules.
+
+    Point systems with leaderboard set keep a ranking of the players
+    by their points, updated along with every award, that can be
+    queried using top, rank and around. This needs a storage provider
+    supporting leaderboards such as the redis ones.
+
+    windows are the calendar windows, see operant.windows, in which
+    the points awarded are counted apart from the lifetime total, such
+    as ("week",) to count the points of each week. They are read using
+    window.
     """
-    def __init__(self, points_id):
+    def __init__(self, points_id, leaderboard=False, windows=()):
         self.points_id = points_id
+        self.leaderboard = leaderboard
+        self.windows = tuple(windows)
+        for window in self.windows:
+            if window not in operant.windows.WINDOWS:
+                raise ValueError("Unknown window {0}".format(window))
+
+    def window(self, window, at=None):
+        """Returns the points of a window, by default its current period
+
+        at is a time, in seconds since the epoch, within the period to
+        return such as a week ago for last week's points.
+        """
+        return PointWindow(self, window, at)
 
     def on_awarded_points(self, user, now, amount):
         """ Called when a player has been awarded points of this kind.
@@ -31,18 +94,75 @@ class PointSystem(object):
             callback(now)
         store.add_points(user.operant_id(), self, amount, _cb)
 
+    @returns_future
     def award(self, store, user, amount=1, callback=None):
         """Awards a number of points to a player"""
         def _cb(n):
-            store.track_event("point.awarded." + self.points_id,
-                              user.operant_id(), dict(amount=amount))
+            track_award(store, "point.awarded." + self.points_id,
+                        user.operant_id(), dict(amount=amount))
             callback(n)
         self._add_points_to_user(store, user, amount, _cb)
 
+    def award_async(self, store, user, amount=1):
+        """Awards a number of points to a player, returning an awaitable"""
+        return awaitable(self.award, store, user, amount)
+
+    @returns_future
+    def award_many(self, store, awards, callback=None):
+        """Awards points to many players at once
+
+        Takes a sequence of (user, amount) pairs, the callback is
+        called with a list of the players' new point counts.
+        """
+        awards = list(awards)
+
+        def _cb(counts):
+            for (user, amount), now in zip(awards, counts):
+                self.on_awarded_points(user, now, amount)
+            callback(counts)
+        store.add_points_many([(user.operant_id(), amount)
+                               for user, amount in awards], self, _cb)
+
+    @returns_future
     def get_count(self, store, user, callback=None):
         """Gets the number of points a player has"""
         store.get_points(user.operant_id(), self, callback)
 
+    def get_count_async(self, store, user):
+        """Gets the number of points a player has as an awaitable"""
+        return awaitable(self.get_count, store, user)
+
+
+class PointWindow(_Ranked):
+    """The points of a point system awarded within a period of time
+
+    Periods are kept by the storage provider for a limited time after
+    they end, the current and previous period can always be read.
+    """
+    def __init__(self, system, window, at=None):
+        if window not in system.windows:
+            raise ValueError("The point system {0} is not counted by {1}"
+                             .format(system.points_id, window))
+        self.system = system
+        self.points_id = system.points_id
+        self.leaderboard = system.leaderboard
+        self.window = window
+        self.at = at
+
+    @property
+    def period(self):
+        """The label of the period, such as 2024-W09"""
+        return operant.windows.period(self.window, self.at)[0]
+
+    @returns_future
+    def get_count(self, store, user, callback=None):
+        """Gets the number of points a player was awarded in the period"""
+        store.get_window_points(user.operant_id(), self, callback)
+
+    def get_count_async(self, store, user):
+        """Gets the points a player was awarded as an awaitable"""
+        return awaitable(self.get_count, store, user)
+
 PointSystems = Registry("point system", "points_id")
 PointSystems.set_str_handler(PointSystem)
 
@@ -1,16 +1,26 @@
 """Reinforcement Schedules"""
 from __future__ import (with_statement, print_function,
                         division, absolute_import)
+import keyword
 import random
+import re
 import time
-import collections
 
 from itertools import chain
 
+from six import integer_types
+
+from operant.base import awaitable, returns_future
+
+try:
+    from collections.abc import Iterable
+except ImportError:
+    from collections import Iterable
+
 
 __all__ = ["Combined", "FixedRatio",
            "VariableRatio", "FixedInterval",
-           "VariableInterval"]
+           "VariableInterval", "RandomStream", "StoredSchedule"]
 
 
 def runif():
@@ -32,6 +42,103 @@ def seconds():
     return int(time.time())
 
 
+class RandomStream(object):
+    """Stream of random numbers drawn in blocks for a schedule
+
+    rng is either a NumPy Generator, a random.Random or a seed for a
+    new generator, NumPy's if it is installed. Uniform and normal
+    values are drawn block_size at a time and the blocks are refilled
+    once used up, making single draws cheap and, with a seed,
+    reproducible. Give each schedule, and each thread, its own
+    stream.
+    """
+
+    def __init__(self, rng=None, block_size=1024):
+        if rng is None or isinstance(rng, integer_types):
+            try:
+                rng = _numpy().random.default_rng(rng)
+            except ImportError:
+                rng = random.Random(rng)
+        self._rng = rng
+        self._numpy = not isinstance(rng, random.Random)
+        self.block_size = block_size
+        self._uniforms = list()
+        self._normals = list()
+
+    def _draw_uniforms(self, n):
+        if self._numpy:
+            return self._rng.random(n).tolist()
+        return [self._rng.random() for _ in range(n)]
+
+    def _draw_normals(self, n):
+        if self._numpy:
+            return self._rng.standard_normal(n).tolist()
+        return [self._rng.gauss(0, 1) for _ in range(n)]
+
+    def uniform(self):
+        """Returns a value between 0 and 1 from a uniform distribution"""
+        try:
+            return self._uniforms.pop()
+        except IndexError:
+            self._uniforms = self._draw_uniforms(self.block_size)
+            return self._uniforms.pop()
+
+    def normal(self, m=0, s=1):
+        """Returns a value from a normal distribution with a given m and sd"""
+        try:
+            return m + s * self._normals.pop()
+        except IndexError:
+            self._normals = self._draw_normals(self.block_size)
+            return m + s * self._normals.pop()
+
+    def uniform_array(self, size):
+        """Returns a NumPy array of size uniform values"""
+        if self._numpy:
+            return self._rng.random(size)
+        return _numpy().array(self._draw_uniforms(size))
+
+    def normal_array(self, m, s, size):
+        """Returns a NumPy array of size normal values"""
+        if self._numpy:
+            return self._rng.normal(m, s, size)
+        np = _numpy()
+        normals = np.array(self._draw_normals(int(np.prod(size))))
+        return m + s * normals.reshape(size)
+
+
+def _stream(rng):
+    if rng is None or isinstance(rng, RandomStream):
+        return rng
+    return RandomStream(rng)
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("You need to install numpy to calculate rewards "
+                          "in batches")
+    return numpy
+
+
+def _batch_size(arrays, size):
+    if size is not None:
+        return size
+    for array in arrays.values():
+        return len(array)
+    raise ValueError("The size is needed when no arrays are passed")
+
+
+_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def _check_names(names):
+    for name in names:
+        if not _IDENTIFIER.match(name) or keyword.iskeyword(name):
+            raise ValueError("Can not compile a schedule tracking {0!r}"
+                             .format(name))
+
+
 def _name_args(arglist, pargs, nargs):
     """Constructs a keywords arguments from positional and kwargs
 
@@ -82,6 +189,44 @@ class _Schedule(object):
     def calc_reward(self, *args, **kwargs):
         return self._reward if self._eval_condition(args, kwargs) else 0
 
+    def _rule(self):
+        """Returns the rule of a storage provider's respond_schedule
+
+        None for schedules without state, which need no store.
+        """
+        return None
+
+    def compile(self):
+        """Returns a function calculating the reward like calc_reward
+
+        The function takes the tracked arguments positionally and
+        skips naming the arguments on each call.
+        """
+        condition, reward = self._condition, self._reward
+
+        def compiled(*args):
+            return reward if condition(*args) else 0
+        return compiled
+
+    def _batch_args(self, pargs, nargs):
+        np = _numpy()
+        return dict((k, np.asarray(v)) for k, v in
+                    _name_args(self.tracking, pargs, nargs).items())
+
+    def calc_reward_batch(self, *args, **kwargs):
+        """Calculates the rewards of many responses at once using NumPy
+
+        Takes arrays in place of the arguments of calc_reward and
+        returns an array of rewards. Schedules tracking nothing, such
+        as VariableRatio, take the number of responses as size.
+        """
+        np = _numpy()
+        size = kwargs.pop("size", None)
+        kwargs.pop("now", None)
+        arrays = self._batch_args(args, kwargs)
+        cond = self._condition_batch(_batch_size(arrays, size), **arrays)
+        return np.where(cond, self._reward, 0)
+
 
 class Combined(object):
     """Combined reinforcement schedule
@@ -98,7 +243,7 @@ class Combined(object):
     def __init__(self, parts, *args):
         if len(args):
             parts = chain((parts, ), args)
-        elif not isinstance(parts, collections.Iterable):
+        elif not isinstance(parts, Iterable):
             parts = (parts,)
 
         self._parts = parts
@@ -165,6 +310,58 @@ class Combined(object):
                 if k in part.tracking)
             yield part(**part_args)
 
+    def compile(self):
+        """Returns a function calling the parts with precomputed arguments
+
+        The parts are frozen, so the parts of a lazy Combined are
+        realized. The function takes the same arguments as the
+        Combined, positionally or by name, but returns a tuple of the
+        rewards of the parts. Schedules are compiled as well. Unlike
+        calling the Combined no dicts or lists are built per call.
+        """
+        parts = list(self._rparts)
+        tracking = self.tracking
+        _check_names(tracking)
+        env = dict()
+        calls = list()
+        for i, part in enumerate(parts):
+            name = "_p{0}".format(i)
+            part_tracking = list(part.tracking)
+            _check_names(part_tracking)
+            if isinstance(part, (_Schedule, Combined)):
+                env[name] = part.compile()
+                args = part_tracking
+            else:
+                env[name] = part
+                args = ["{0}={0}".format(x) for x in part_tracking]
+            calls.append("{0}({1})".format(name, ", ".join(args)))
+        source = "def compiled({0}):\n    return ({1}{2})\n".format(
+            ", ".join(tracking), ", ".join(calls), "," if calls else "")
+        exec(source, env)
+        return env["compiled"]
+
+    def calc_reward_batch(self, *args, **kwargs):
+        """Calculates the rewards of many responses for every part
+
+        Takes arrays in place of the arguments, as calc_reward_batch
+        of the parts does, and returns a list of their results. The
+        interval schedules share the same current time.
+        """
+        size = kwargs.pop("size", None)
+        now = kwargs.pop("now", None)
+        kws = _name_args(self.tracking, args, kwargs)
+        size = _batch_size(kws, size)
+        if now is None:
+            now = seconds()
+        results = list()
+        for part in self._rparts:
+            part_args = dict(
+                (k, w) for k, w in kws.items()
+                if k in part.tracking)
+            results.append(part.calc_reward_batch(size=size, now=now,
+                                                  **part_args))
+        return results
+
 
 class _Ratio(_Schedule):
     def __init__(self, nth, *args, **kwargs):
@@ -197,16 +394,29 @@ class FixedRatio(_Ratio):
     def _condition(self, current):
         return current > 0 and current % self._nth == 0
 
+    def _rule(self):
+        return ("ratio", self._reward, self._nth)
+
+    def _condition_batch(self, size, current):
+        if self._nth == 1:
+            return _numpy().ones(size, dtype=bool)
+        return (current > 0) & (current % self._nth == 0)
+
 
 class VariableRatio(_Ratio):
     """Variable ratio schedule. Reward on average once every nth.
 
     The probability is constant, thus resulting in a variable reward
-    frequency.
+    frequency. Passing rng, a RandomStream or anything it takes, draws
+    from it rather than the global random.
     """
     abbrev = "VR"
     tracking = []
 
+    def __init__(self, nth, *args, **kwargs):
+        self._rng = _stream(kwargs.pop("rng", None))
+        super(VariableRatio, self).__init__(nth, *args, **kwargs)
+
     @property
     def _crit(self):
         if not hasattr(self, "__crit"):
@@ -214,7 +424,14 @@ class VariableRatio(_Ratio):
         return self.__crit
 
     def _condition(self):
-        return runif() > self._crit
+        if self._rng is None:
+            return runif() > self._crit
+        return self._rng.uniform() > self._crit
+
+    def _condition_batch(self, size):
+        if self._rng is None:
+            return _numpy().random.random_sample(size) > self._crit
+        return self._rng.uniform_array(size) > self._crit
 
 
 class _Interval(_Schedule):
@@ -232,14 +449,60 @@ class _Interval(_Schedule):
         now = seconds()
         c = self._eval_condition(args, kwargs, now=now)
         if c:
-            return (now, self._reward)
+            return (self._next_last(now), self._reward)
         else:
             return (None, 0)
 
+    def _next_last(self, now):
+        return now
+
+    def _next_last_batch(self, now, shape):
+        return now
+
+    def _rule(self):
+        now = seconds()
+        return ("interval", self._reward, now, self._threshold(),
+                self._next_last(now) - now)
+
     def _condition(self, last, now=seconds()):
         delta = now - last
         return self._delta_condition(delta)
 
+    def compile(self):
+        """Returns a function calculating the reward like calc_reward
+
+        The function takes last positionally and skips naming the
+        arguments on each call.
+        """
+        condition, reward = self._delta_condition, self._reward
+        next_last = self._next_last
+
+        def compiled(last):
+            now = seconds()
+            if condition(now - last):
+                return (next_last(now), reward)
+            return (None, 0)
+        return compiled
+
+    def calc_reward_batch(self, *args, **kwargs):
+        """Calculates the rewards of many responses at once using NumPy
+
+        Takes an array of the last times as last and returns a two
+        tuple of arrays, the times to update the last times with, the
+        current time where rewarded and the passed in otherwise, and
+        the rewards. now may be passed to use the same current time
+        for several batches.
+        """
+        np = _numpy()
+        kwargs.pop("size", None)
+        now = kwargs.pop("now", None)
+        if now is None:
+            now = seconds()
+        last = self._batch_args(args, kwargs)["last"]
+        cond = self._delta_condition_batch(now - last)
+        return (np.where(cond, self._next_last_batch(now, last.shape), last),
+                np.where(cond, self._reward, 0))
+
 
 class FixedInterval(_Interval):
     """Fixed interval schedule. Reward if a minimum time has passed.
@@ -256,6 +519,12 @@ class FixedInterval(_Interval):
     def _delta_condition(self, delta):
         return delta >= self._interval
 
+    def _delta_condition_batch(self, delta):
+        return delta >= self._interval
+
+    def _threshold(self):
+        return self._interval
+
 
 class VariableInterval(_Interval):
     """Variable interval schedule. Reward if a random time has passed.
@@ -276,13 +545,94 @@ class VariableInterval(_Interval):
     opposed to pre-response, resulting in a higher chance of reward
     with more responses. However for most practical gamification
     purposes this should be a good enough approximation.
+
+    Passing rng, a RandomStream or anything it takes, draws from it
+    rather than the global random.
+
+    With exact set the interval is instead drawn once per reward,
+    rounded to whole seconds. The time returned to update last with
+    is then the time at which the next reward is due, making the
+    following responses a mere comparison of the current time with
+    last.
     """
     abbrev = "VI"
 
     def __init__(self, interval, s=1, *args, **kwargs):
         self._s = s
+        self._rng = _stream(kwargs.pop("rng", None))
+        self._exact = kwargs.pop("exact", False)
         super(VariableInterval, self).__init__(*args,
                                                interval=interval, **kwargs)
 
+    def _repr_options(self):
+        return (self._interval, "exact" if self._exact else None)
+
+    def _draw(self):
+        if self._rng is None:
+            return rnorm(self._interval, self._s)
+        return self._rng.normal(self._interval, self._s)
+
+    def _draw_batch(self, shape):
+        if self._rng is None:
+            return _numpy().random.normal(self._interval, self._s, shape)
+        return self._rng.normal_array(self._interval, self._s, shape)
+
     def _delta_condition(self, delta):
-        return delta >= rnorm(self._interval, self._s)
+        if self._exact:
+            return delta >= 0
+        return delta >= self._draw()
+
+    def _threshold(self):
+        if self._exact:
+            return 0
+        return self._draw()
+
+    def _delta_condition_batch(self, delta):
+        if self._exact:
+            return delta >= 0
+        return delta >= self._draw_batch(delta.shape)
+
+    def _next_last(self, now):
+        if self._exact:
+            return now + int(round(self._draw()))
+        return now
+
+    def _next_last_batch(self, now, shape):
+        if self._exact:
+            return now + _numpy().rint(self._draw_batch(shape)).astype(int)
+        return now
+
+
+class StoredSchedule(object):
+    """A schedule keeping its state in a storage provider
+
+    Rather than having the callers keep track of the current count
+    of a FixedRatio or the last time of an interval schedule, the
+    state is kept by the storage provider, per user and key, and
+    updated atomically with evaluating the schedule. For the redis
+    storage providers a response is a single server-side script.
+    Schedules without state, VariableRatio, are evaluated locally.
+    """
+
+    def __init__(self, schedule, key):
+        if isinstance(schedule, Combined):
+            raise TypeError("Store the parts of a Combined separately")
+        self.schedule = schedule
+        self.key = key
+
+    def __repr__(self):
+        return "StoredSchedule({0!r}, {1!r})".format(self.schedule, self.key)
+
+    @returns_future
+    def calc_reward(self, store, user, callback=None):
+        """Counts a response of the user, calling back with the reward"""
+        rule = self.schedule._rule()
+        if rule is None:
+            callback(self.schedule())
+        else:
+            store.respond_schedule(user.operant_id(), self.key, rule,
+                                   callback)
+
+    def calc_reward_async(self, store, user):
+        """Counts a response of the user, returning an awaitable"""
+        return awaitable(self.calc_reward, store, user)
@@ -0,0 +1,114 @@
+"""Module for asyncio support using redis-py's asyncio client
+
+Storage calls are scheduled as tasks on the running event loop and
+call their callbacks once done, the awaitable variants of the model
+methods such as PointSystem.award_async can be used to await them.
+"""
+import asyncio
+
+import zope.interface as interface
+
+try:
+    import redis
+    import redis.asyncio
+except ImportError:
+    raise ImportError("You need to install the redis python package "
+                      "(4.2 or later) to use this storage module")
+
+import operant.data
+from operant.base import current_errback
+from operant.storage import redis_scripts
+from operant.storage.common_redis import parse_counter, RedisCommon
+
+
+@interface.implementer(operant.data.IStorageProvider)
+class AsyncioRedis(RedisCommon):
+    """Storage provider for asyncio applications
+
+    Takes either a redis.asyncio client or a dict of options for one.
+    Clients created from a dict share a blocking connection pool, so
+    a burst of concurrent calls waits for a free connection instead of
+    failing once max_connections is reached.
+
+    A failed call never calls its callback. The exception goes to the
+    future of calls made without one, to the errback passed to the
+    model method or else to the errback of the provider. Without any
+    of them it is passed to the event loop's exception handler.
+    """
+
+    def __init__(self, client, errback=None, **kwargs):
+        if isinstance(client, dict):
+            pool = redis.asyncio.BlockingConnectionPool(**client)
+            client = redis.asyncio.Redis(connection_pool=pool)
+        self.client = client
+        self.errback = errback
+        self._tasks = set()
+        super(AsyncioRedis, self).__init__(**kwargs)
+
+    def _spawn(self, coro, callback):
+        errback = current_errback() or self.errback
+        task = asyncio.ensure_future(coro)
+        # The loop only keeps weak references to its tasks
+        self._tasks.add(task)
+
+        def _done(task):
+            self._tasks.discard(task)
+            if task.cancelled():
+                return
+            exc = task.exception()
+            if exc is None:
+                callback(task.result())
+            elif errback is not None:
+                errback(exc)
+            else:
+                task.get_loop().call_exception_handler(dict(
+                    message="Storage call failed", exception=exc,
+                    task=task))
+        task.add_done_callback(_done)
+
+    async def _add_member(self, name, args):
+        return self._badge_new(await getattr(self.client, name)(*args))
+
+    def _badge_add(self, user, badge, callback):
+        name, args = self._badge_cmd(user, badge.badge_id)
+        self._spawn(self._add_member(name, args), callback)
+
+    async def _execute(self, cmds, transaction):
+        pipe = self.client.pipeline(transaction=transaction)
+        for name, args in cmds:
+            getattr(pipe, name)(*args)
+        return await pipe.execute()
+
+    def _pipeline(self, cmds, callback, transaction=False):
+        self._spawn(self._execute(cmds, transaction), callback)
+
+    async def _evalsha(self, name, keys, args):
+        sha = redis_scripts.SHAS[name]
+        try:
+            return await self.client.evalsha(sha, len(keys), *(keys + args))
+        except redis.exceptions.NoScriptError:
+            await self.client.script_load(redis_scripts.SCRIPTS[name])
+            return await self.client.evalsha(sha, len(keys), *(keys + args))
+
+    def _eval_script(self, name, keys, args, callback):
+        self._spawn(self._evalsha(name, keys, args), callback)
+
+    def _counter_add(self, user, counter, amount, callback):
+        hash_name, field = self._counter_location(user, counter)
+        self._spawn(self.client.hincrby(hash_name, field, amount), callback)
+
+    async def _hget(self, hash_name, field):
+        return parse_counter(await self.client.hget(hash_name, field))
+
+    def _counter_get(self, user, counter, callback):
+        hash_name, field = self._counter_location(user, counter)
+        self._spawn(self._hget(hash_name, field), callback)
+
+    async def close(self):
+        """Waits for pending calls and closes the client's connections"""
+        # Callbacks may make further calls, such as tracking events
+        while self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        # aclose replaced close in redis 5.0.1
+        close = getattr(self.client, "aclose", None) or self.client.close
+        await close()
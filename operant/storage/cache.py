@@ -0,0 +1,321 @@
+"""Module for caching counter reads of another storage provider"""
+from __future__ import (with_statement, print_function,
+                        division, absolute_import)
+import threading
+import time
+from collections import OrderedDict
+from itertools import islice
+
+import zope.interface as interface
+
+import operant.data
+
+
+@interface.implementer(operant.data.IStorageProvider)
+class CachedStorage(object):
+    """Read-through cache of point counts and balances
+
+    Wraps any storage provider, answering get_points and get_balance
+    from a LRU cache of at most maxsize counters. Entries expire after
+    ttl seconds, or never if ttl is None. Awards update the cached
+    value in place with the post-increment value passed to their
+    callbacks, so reads stay consistent with writes made through the
+    cache. Writes made elsewhere are seen once the entry expires.
+
+    Calls complete out of order with the asynchronous providers, so
+    every write to a counter starts a new generation of it. A value
+    is only cached if no write to its counter started after the call
+    it came from, or was pending when it started, so a late reply can
+    not replace a newer value.
+
+    Everything else is passed on to the wrapped provider.
+    """
+
+    def __init__(self, store, maxsize=10000, ttl=60):
+        self.store = store
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._generation = 0
+        # The generation of the latest write to each counter and the
+        # number of pending writes, values of calls older than forgotten
+        # writes are dropped
+        self._written = OrderedDict()
+        self._oldest = 0
+        # Counters with pending writes are never forgotten, so only
+        # writes made before invalidating are unaccounted for
+        self._invalidated = 0
+
+    def __getattr__(self, name):
+        return getattr(self.store, name)
+
+    @property
+    def records_award_events(self):
+        return getattr(self.store, "records_award_events", False)
+
+    def batch(self, *args, **kwargs):
+        """Returns a batch of the wrapped provider updating this cache"""
+        return _CachedBatch(self, self.store.batch(*args, **kwargs))
+
+    def _begin_read(self, key):
+        """Returns the generation of a read, None if not to be cached"""
+        with self._lock:
+            written = self._written.get(key)
+            if written is not None and written[1]:
+                return None
+            return self._generation
+
+    def _begin_write(self, key):
+        """Starts a generation of a counter for a write to it
+
+        Returns the generation and whether no other write was pending.
+        """
+        with self._lock:
+            self._generation += 1
+            written = self._written.pop(key, None) or [0, 0]
+            self._written[key] = [self._generation, written[1] + 1]
+            excess = len(self._written) - self.maxsize
+            if excess > 0:
+                # Counters with pending writes are kept, those of writes
+                # that never complete are only dropped by invalidate
+                idle = (k for k, (_, pending) in self._written.items()
+                        if not pending)
+                for k in list(islice(idle, excess)):
+                    forgotten, _ = self._written.pop(k)
+                    self._oldest = max(self._oldest, forgotten)
+            return (self._generation, not written[1])
+
+    def _lookup(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None and (entry[1] is None or
+                                      entry[1] > time.time()):
+                # Re-inserting marks the entry as most recently used
+                self._entries[key] = entry
+                self.hits += 1
+                return entry
+            self.misses += 1
+            return None
+
+    def _insert(self, key, value):
+        expires = time.time() + self.ttl if self.ttl is not None else None
+        self._entries.pop(key, None)
+        self._entries[key] = (value, expires)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def _fill(self, key, value, generation):
+        """Caches the value of a read unless a write started since"""
+        with self._lock:
+            if generation is None or generation < self._oldest:
+                return
+            written = self._written.get(key)
+            if written is not None and written[0] > generation:
+                return
+            self._insert(key, value)
+
+    def _put(self, key, value, write):
+        """Caches the value of a write unless it overlapped another
+
+        The order overlapping writes were applied in is unknown, so
+        their values are dropped along with the cached one.
+        """
+        generation, alone = write
+        with self._lock:
+            if generation < self._invalidated:
+                self._entries.pop(key, None)
+                return
+            written = self._written.get(key)
+            if written is not None:
+                written[1] -= 1
+            if (value is None or not alone or written is None or
+                    written[0] != generation):
+                self._entries.pop(key, None)
+                return
+            self._insert(key, value)
+
+    def _reading(self, key, callback):
+        generation = self._begin_read(key)
+
+        def _cb(value):
+            if value is not None:
+                self._fill(key, value, generation)
+            callback(value)
+        return _cb
+
+    def _writing(self, key, callback):
+        write = self._begin_write(key)
+
+        def _cb(value):
+            self._put(key, value, write)
+            callback(value)
+        return _cb
+
+    def _writing_many(self, awards, kind, callback):
+        writes = [self._begin_write((user, kind)) for user, _ in awards]
+
+        def _cb(values):
+            for (user, _), write, value in zip(awards, writes, values):
+                self._put((user, kind), value, write)
+            callback(values)
+        return _cb
+
+    def invalidate(self, user=None):
+        """Drops the cached counters of a user, or all if None
+
+        The values of calls already made are not cached either, which
+        also lets counters with writes that never completed, such as
+        failed ones, be cached again.
+        """
+        with self._lock:
+            self._generation += 1
+            self._oldest = self._invalidated = self._generation
+            if user is None:
+                self._entries.clear()
+                self._written.clear()
+                return
+            for key in [k for k in self._entries if k[0] == user]:
+                del self._entries[key]
+            for key in [k for k in self._written if k[0] == user]:
+                del self._written[key]
+
+    def stats(self):
+        """Returns a dict of the hits, misses and size of the cache"""
+        with self._lock:
+            return dict(hits=self.hits, misses=self.misses,
+                        size=len(self._entries))
+
+    def add_badge(self, user, badge, callback):
+        self.store.add_badge(user, badge, callback)
+
+    def add_badge_many(self, users, badge, callback):
+        self.store.add_badge_many(users, badge, callback)
+
+    def track_event(self, event, subject=None, ext={}):
+        self.store.track_event(event, subject, ext)
+
+    def add_balance(self, user, currency, amount, callback):
+        key = (user, ("currency", currency.currency_id))
+        self.store.add_balance(user, currency, amount,
+                               self._writing(key, callback))
+
+    def add_balance_many(self, awards, currency, callback):
+        awards = list(awards)
+        kind = ("currency", currency.currency_id)
+        self.store.add_balance_many(awards, currency,
+                                    self._writing_many(awards, kind,
+                                                       callback))
+
+    def deduct_balance(self, user, currency, amount, callback):
+        key = (user, ("currency", currency.currency_id))
+        self.store.deduct_balance(user, currency, amount,
+                                  self._writing(key, callback))
+
+    def spend_balance(self, user, currency, amount, callback):
+        key = (user, ("currency", currency.currency_id))
+        write = self._begin_write(key)
+
+        def _cb(res):
+            self._put(key, res[1], write)
+            callback(res)
+        self.store.spend_balance(user, currency, amount, _cb)
+
+    def exchange(self, user, pay, receive, callback):
+        pay, receive = list(pay), list(receive)
+        writes = dict(
+            (currency_id,
+             self._begin_write((user, ("currency", currency_id))))
+            for currency_id in set(c.currency_id for c, _ in pay + receive))
+
+        def _cb(res):
+            for currency_id, balance in res[1].items():
+                self._put((user, ("currency", currency_id)), balance,
+                          writes[currency_id])
+            callback(res)
+        self.store.exchange(user, pay, receive, _cb)
+
+    def respond_schedule(self, user, key, rule, callback):
+        self.store.respond_schedule(user, key, rule, callback)
+
+    def get_balance(self, user, currency, callback):
+        key = (user, ("currency", currency.currency_id))
+        entry = self._lookup(key)
+        if entry is not None:
+            callback(entry[0])
+        else:
+            self.store.get_balance(user, currency,
+                                   self._reading(key, callback))
+
+    def add_points(self, user, points, amount, callback):
+        key = (user, ("points", points.points_id))
+        self.store.add_points(user, points, amount,
+                              self._writing(key, callback))
+
+    def add_points_many(self, awards, points, callback):
+        awards = list(awards)
+        kind = ("points", points.points_id)
+        self.store.add_points_many(awards, points,
+                                   self._writing_many(awards, kind,
+                                                      callback))
+
+    def get_points(self, user, points, callback):
+        key = (user, ("points", points.points_id))
+        entry = self._lookup(key)
+        if entry is not None:
+            callback(entry[0])
+        else:
+            self.store.get_points(user, points,
+                                  self._reading(key, callback))
+
+
+class _CachedBatch(CachedStorage):
+    """Batch of the wrapped provider, updating the cache it came from"""
+
+    def __init__(self, cache, batch):
+        self.store = batch
+        self._cache = cache
+        # The writes begun and not yet completed, by generation
+        self._begun = dict()
+
+    def __enter__(self):
+        self.store.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            return self.store.__exit__(exc_type, exc_value, traceback)
+        finally:
+            if exc_type is not None:
+                # The batch dropped its calls, their writes never complete
+                for key, write in list(self._begun.values()):
+                    self._put(key, None, write)
+
+    def batch(self, *args, **kwargs):
+        raise TypeError("Batches can not be nested")
+
+    def _lookup(self, key):
+        return self._cache._lookup(key)
+
+    def _put(self, key, value, write):
+        if self._begun.pop(write[0], None) is not None:
+            self._cache._put(key, value, write)
+
+    def _fill(self, key, value, generation):
+        self._cache._fill(key, value, generation)
+
+    def _begin_read(self, key):
+        return self._cache._begin_read(key)
+
+    def _begin_write(self, key):
+        write = self._cache._begin_write(key)
+        self._begun[write[0]] = (key, write)
+        return write
+
+    def invalidate(self, user=None):
+        self._cache.invalidate(user)
+
+    def stats(self):
+        return self._cache.stats()
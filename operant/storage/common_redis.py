@@ -1,6 +1,15 @@
 """Functions common to all our redis storage implementations"""
-from six import integer_types
-import json
+from six import integer_types, string_types, binary_type
+import time
+import uuid
+from itertools import chain, count
+
+import zope.interface as interface
+
+import operant.data
+import operant.windows
+from operant.storage import redis_scripts
+from operant.storage.event_codecs import JSONCodec
 
 
 def mkname(*args):
@@ -14,15 +23,585 @@ def user_id(id_):
         return id_
 
 
+def _crc16_table():
+    table = list()
+    for byte in range(256):
+        crc = byte << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021) if crc & 0x8000 else crc << 1
+        table.append(crc & 0xFFFF)
+    return table
+
+_CRC16 = _crc16_table()
+CLUSTER_SLOTS = 16384
+
+
+def keyslot(key):
+    """Returns the redis cluster hash slot of a key
+
+    Like redis only the part within the first pair of braces, the hash
+    tag, is hashed if there is one.
+    """
+    start = key.find("{")
+    if start != -1:
+        end = key.find("}", start + 1)
+        if end > start + 1:
+            key = key[start + 1:end]
+    crc = 0
+    for byte in bytearray(key.encode("utf-8")):
+        crc = ((crc << 8) & 0xFFFF) ^ _CRC16[(crc >> 8) ^ byte]
+    return crc % CLUSTER_SLOTS
+
+_slot_tags = list()
+
+
+def slot_tag(slot):
+    """Returns a hash tag mapping to the given cluster hash slot"""
+    if not _slot_tags:
+        tags = [None] * CLUSTER_SLOTS
+        missing = CLUSTER_SLOTS
+        i = 0
+        while missing:
+            tag = str(i)
+            n = keyslot(tag)
+            if tags[n] is None:
+                tags[n] = tag
+                missing -= 1
+            i += 1
+        _slot_tags[:] = tags
+    return _slot_tags[slot]
+
+
+def event_shard(slot):
+    """Returns the key of the global event log shard of a hash slot"""
+    return mkname("events", "slot", "{" + slot_tag(slot) + "}")
+
+
+def parse_counter(res):
+    """Parses the value of a counter as returned by redis"""
+    if isinstance(res, string_types + (binary_type,)):
+        try:
+            return int(res)
+        except ValueError:
+            return float(res)
+    elif res is None:
+        return 0
+    else:
+        return res
+
+
+def _text(value):
+    if isinstance(value, binary_type):
+        return value.decode("utf-8")
+    return value
+
+
+def _ignore(res):
+    pass
+
+
+def _ignore_reply(item, replies):
+    pass
+
+
 class RedisCommon(object):
+    """Base for the redis storage providers
+
+    Takes the following keyword options:
+
+    scripts -- Run awards as server-side scripts, mutating the counter
+               or badge set and recording the event in one round trip.
+    chunk_size -- The number of users handled per pipeline by the
+                  bulk operations.
+    event_log -- Either "list", the default, or "stream" to record
+                 events using XADD instead of LPUSH.
+    max_events -- Caps the length of the global event log, trimmed in
+                  the same pipeline as the events are recorded. Streams
+                  are trimmed approximately (MAXLEN ~).
+    max_user_events -- Caps the length of the per-user event logs.
+    user_events_ttl -- Seconds of inactivity after which the event log
+                       of a user expires.
+    cluster -- Use a key layout suitable for redis cluster. The keys of
+               a user are hash tagged with the user id and the global
+               event log is split into one shard per hash slot, see
+               event_shard, so that the keys used together in pipelines
+               and scripts are all in the same slot.
+    event_partitions -- Splits the global event log into this many
+                        partitions, events:partition:0 and on. Events in
+                        partitioned logs carry the time they were
+                        recorded, see operant.storage.events.merged.
+    partition_by -- Either "user", the default, placing the events of
+                    a user in the same partition, or "round_robin".
+    layout -- Either "keys", the default, giving each user their own
+              counter hash and badge set, or "bucketed". The bucketed
+              layout groups bucket_size users into shared hashes, such
+              as counter:b:<uid // bucket_size> with fields
+              <uid>:<counter>, saving the per-key overhead of redis.
+              It needs integer user ids, see
+              operant.storage.migrate for moving existing data.
+    bucket_size -- The number of users per bucket. To keep the bucket
+                   hashes in the compact listpack encoding the users
+                   in a bucket times the counters (or badges) of each
+                   must stay below hash-max-listpack-entries, 128 by
+                   default.
+    badge_layout -- Either "keys", storing badges as the layout option
+                    says, or "bitmap". The bitmap layout keeps a bitmap
+                    per badge, badge:<badge_id>, with a bit set at the
+                    index of each user holding it. It needs integer user
+                    ids and uses uid / 8 bytes for the highest user id
+                    awarded, so it suits densely allocated ids. See
+                    badge_holders and count_badge_holders.
+    window_retention -- The number of periods the counters and
+                        leaderboards of windowed point systems are kept
+                        after the period ends, see operant.windows.
+    codec -- The codec encoding the recorded events, JSON by default.
+             See operant.storage.event_codecs.
+    event_rules -- An EventRules deciding which events are recorded
+                   and in which logs, see operant.storage.event_rules.
+
+    Awards record their events themselves, in the same script or
+    pipeline where possible.
+    """
+    records_award_events = True
+
+    def __init__(self, scripts=False, chunk_size=1000, event_log="list",
+                 max_events=None, max_user_events=None,
+                 user_events_ttl=None, cluster=False, event_partitions=1,
+                 partition_by="user", layout="keys", bucket_size=32,
+                 badge_layout="keys", window_retention=1, codec=None,
+                 event_rules=None):
+        if event_log not in ("list", "stream"):
+            raise ValueError("Unknown kind of event log {0}"
+                             .format(event_log))
+        if partition_by not in ("user", "round_robin"):
+            raise ValueError("Unknown partitioning {0}".format(partition_by))
+        if layout not in ("keys", "bucketed"):
+            raise ValueError("Unknown key layout {0}".format(layout))
+        if badge_layout not in ("keys", "bitmap"):
+            raise ValueError("Unknown badge layout {0}".format(badge_layout))
+        if cluster and (layout != "keys" or badge_layout != "keys"):
+            raise ValueError("The cluster layout keeps the keys of each "
+                             "user in their own slot")
+        if cluster and event_partitions > 1:
+            raise ValueError("The cluster layout already shards the "
+                             "global event log")
+        self.scripts = scripts
+        self.chunk_size = chunk_size
+        self.event_log = event_log
+        self.max_events = max_events
+        self.max_user_events = max_user_events
+        self.user_events_ttl = user_events_ttl
+        self.cluster = cluster
+        self.event_partitions = event_partitions
+        self.partition_by = partition_by
+        self.layout = layout
+        self.bucket_size = bucket_size
+        self.badge_layout = badge_layout
+        self.window_retention = window_retention
+        self.codec = codec if codec is not None else JSONCodec()
+        self.event_rules = event_rules
+        self._next_partition = count()
+
+    def batch(self, transaction=True):
+        """Returns a unit of work to use in a with statement
+
+        Storage calls made against the batch are sent in one pipeline,
+        a MULTI/EXEC transaction unless told otherwise, when the with
+        block exits.
+        """
+        return RedisBatch(self, transaction)
+
+    def _record(self, body):
+        """Records an event body in the event logs"""
+        cmds = self._event_cmds(body)
+        if cmds:
+            self._add_to_ev(cmds)
+
+    def _recording(self, body, callback):
+        """Wraps a callback of an award, first recording its event"""
+        def _cb(res):
+            self._record(body)
+            callback(res)
+        return _cb
+
+    def _user_key(self, kind, user):
+        uid = user_id(user)
+        if self.cluster:
+            uid = "{" + uid + "}"
+        return mkname(kind, uid)
+
+    def _user_index(self, user):
+        try:
+            return int(user_id(user))
+        except ValueError:
+            raise ValueError("The bucketed and bitmap layouts need integer "
+                             "user ids")
+
+    def _bucket(self, user):
+        return str(self._user_index(user) // self.bucket_size)
+
+    def _counter_location(self, user, counter):
+        """Returns the hash and field holding a counter of a user"""
+        if self.layout == "bucketed":
+            return (mkname("counter", "b", self._bucket(user)),
+                    mkname(user_id(user), counter))
+        return (self._user_key("counter", user), counter)
+
+    def _badge_cmd(self, user, badge_id):
+        """Returns the command adding a badge, see _badge_new"""
+        if self.badge_layout == "bitmap":
+            return ("setbit", (mkname("badge", badge_id),
+                               self._user_index(user), 1))
+        if self.layout == "bucketed":
+            return ("hsetnx", (mkname("badges", "b", self._bucket(user)),
+                               mkname(user_id(user), badge_id), 1))
+        return ("sadd", (self._user_key("badges", user), badge_id))
+
+    def _badge_new(self, reply):
+        """Tells if the reply to a _badge_cmd command means a new badge"""
+        if self.badge_layout == "bitmap":
+            # SETBIT replies with the previous value of the bit
+            return reply == 0
+        return reply == 1
+
+    def _badge_check_cmd(self, user, badge_id):
+        name, args = self._badge_cmd(user, badge_id)
+        if name == "setbit":
+            return ("getbit", args[:2])
+        if name == "hsetnx":
+            return ("hexists", args[:2])
+        return ("sismember", args)
+
+    def _partition(self, uid):
+        if self.partition_by == "round_robin":
+            return next(self._next_partition) % self.event_partitions
+        return keyslot(uid) % self.event_partitions
+
+    def _event_keys(self, subject):
+        """Returns the global and user event log, None without subject"""
+        uid = user_id(subject) if subject is not None else ""
+        if self.cluster:
+            gkey = event_shard(keyslot(uid))
+        elif self.event_partitions > 1:
+            gkey = mkname("events", "partition", str(self._partition(uid)))
+        else:
+            gkey = mkname("events")
+        if subject is None:
+            return [gkey, None]
+        return [gkey, self._user_key("events", subject)]
+
+    def global_event_keys(self):
+        """Returns the keys making up the global event log"""
+        if self.cluster:
+            return [event_shard(slot) for slot in range(CLUSTER_SLOTS)]
+        if self.event_partitions > 1:
+            return [mkname("events", "partition", str(n))
+                    for n in range(self.event_partitions)]
+        return [mkname("events")]
+
+    def _encode_event(self, body):
+        # Sharded global logs are read back merged by time
+        if self.cluster or self.event_partitions > 1:
+            body = body + (time.time(),)
+        return self.codec.encode(body)
+
+    def _route(self, event):
+        """Returns whether to record an event globally and for the user"""
+        if self.event_rules is None:
+            return (True, True)
+        return self.event_rules.route(event)
+
+    def _event_args(self, body):
+        """Arguments passed to scripts recording the event"""
+        to_global, to_user = self._route(body[0])
+        targets = ("g" if to_global else "") + ("u" if to_user else "")
+        data = self._encode_event(body) if targets else ""
+        return [data, self.event_log, self.max_events or 0,
+                self.max_user_events or 0, self.user_events_ttl or 0,
+                targets]
+
+    def _push_cmds(self, key, data, max_len):
+        if self.event_log == "stream":
+            if max_len:
+                args = ("XADD", key, "MAXLEN", "~", max_len, "*", "data", data)
+            else:
+                args = ("XADD", key, "*", "data", data)
+            return [("execute_command", args)]
+
+        cmds = [("lpush", (key, data))]
+        if max_len:
+            cmds.append(("ltrim", (key, 0, max_len - 1)))
+        return cmds
+
+    def _event_cmds(self, body):
+        """Returns the commands recording an event, if any"""
+        to_global, to_user = self._route(body[0])
+        if not (to_global or to_user):
+            return []
+        data = self._encode_event(body)
+        gkey, pkey = self._event_keys(body[1])
+        cmds = list()
+        if to_global:
+            cmds.extend(self._push_cmds(gkey, data, self.max_events))
+        if to_user and pkey is not None:
+            cmds.extend(self._push_cmds(pkey, data, self.max_user_events))
+            if self.user_events_ttl:
+                cmds.append(("expire", (pkey, self.user_events_ttl)))
+        return cmds
+
+    def _add_to_ev(self, cmds):
+        self._pipeline(cmds, _ignore)
+
+    def _pipeline_many(self, items, cmds_for, result_of, callback):
+        """Runs the commands for many items in pipelines of chunk_size items
+
+        cmds_for gives the commands for an item and result_of picks the
+        item's result from the replies to them. The callback is called
+        with a list of the results in the order of the items.
+        """
+        items = list(items)
+        results = list()
+
+        def _run():
+            # Loops for as long as the pipelines complete synchronously
+            # and is called again from the callback when they do not.
+            while len(results) < len(items):
+                chunk = items[len(results):len(results) + self.chunk_size]
+                cmds = list()
+                lens = list()
+                for item in chunk:
+                    item_cmds = cmds_for(item)
+                    cmds.extend(item_cmds)
+                    lens.append(len(item_cmds))
+
+                state = dict(returned=False, done=False)
+
+                def _done(replies, chunk=chunk, lens=lens, state=state):
+                    pos = 0
+                    for item, n in zip(chunk, lens):
+                        results.append(result_of(item, replies[pos:pos + n]))
+                        pos += n
+                    state["done"] = True
+                    if state["returned"]:
+                        _run()
+
+                self._pipeline(cmds, _done)
+                state["returned"] = True
+                if not state["done"]:
+                    return
+            callback(results)
+        _run()
+
+    def _counter_cmds(self, user, counter, amount, tallies=()):
+        """Returns the commands adding to a counter, the HINCRBY first"""
+        hash_name, field = self._counter_location(user, counter)
+        cmds = [("hincrby", (hash_name, field, amount))]
+        uid = user_id(user)
+        for kind, key, expire_at in tallies:
+            if kind == "zincrby":
+                # The clients disagree on the order of the zincrby args
+                cmds.append(("execute_command",
+                             ("ZINCRBY", key, amount, uid)))
+            else:
+                cmds.append(("hincrby", (key, uid, amount)))
+            if expire_at:
+                cmds.append(("expireat", (key, expire_at)))
+        return cmds
+
+    def _counter_add_many(self, awards, counter, event_name, callback,
+                          tallies=()):
+        def cmds_for(award):
+            user, amount = award
+            return (self._counter_cmds(user, counter, amount, tallies) +
+                    self._event_cmds((event_name, user,
+                                      dict(amount=amount))))
+
+        def result_of(award, replies):
+            return replies[0]
+        self._pipeline_many(awards, cmds_for, result_of, callback)
+
+    def _counter_award(self, user, counter, amount, event, callback,
+                       tallies=()):
+        """Adds to a counter in an award causing the passed in event
+
+        tallies are further aggregates the amount is added to along
+        with the counter, see _tallies. The event is recorded by the
+        script, or unless scripts are used along with the tallies or
+        once the counter is updated.
+        """
+        name, ext = event
+        body = (name, user, ext)
+        if not self.scripts:
+            if not tallies:
+                self._counter_add(user, counter, amount,
+                                  self._recording(body, callback))
+            else:
+                self._pipeline(self._counter_cmds(user, counter, amount,
+                                                  tallies) +
+                               self._event_cmds(body),
+                               lambda replies: callback(replies[0]),
+                               transaction=True)
+            return
+
+        hash_name, field = self._counter_location(user, counter)
+        keys = [hash_name] + self._event_keys(user)
+        args = ([field, amount] +
+                self._event_args(body) +
+                [user_id(user)])
+        for kind, key, expire_at in tallies:
+            keys.append(key)
+            args.extend([kind, expire_at or 0])
+        self._eval_script("counter_add", keys, args, callback)
+
+    def add_badge(self, user, badge, callback):
+        if not self.scripts:
+            body = ("badge.awarded." + badge.badge_id, user, {})
+
+            def _cb(success):
+                if success:
+                    self._record(body)
+                callback(success)
+            self._badge_add(user, badge, _cb)
+        else:
+            self._badge_add_script(user, badge, callback)
+
+    def _badge_add_script(self, user, badge, callback):
+        """Adds a badge, recording the event if it is new, in a script"""
+        body = ("badge.awarded." + badge.badge_id, user, {})
+        name, args = self._badge_cmd(user, badge.badge_id)
+        keys = [args[0]] + self._event_keys(user)
+        self._eval_script("badge_add", keys,
+                          [name, args[1]] +
+                          self._event_args(body),
+                          lambda n: callback(n == 1))
+
+    def add_badge_many(self, users, badge, callback):
+        users = list(users)
+        event_name = "badge.awarded." + badge.badge_id
+
+        def add_for(user):
+            return [self._badge_cmd(user, badge.badge_id)]
+
+        def added(user, replies):
+            return self._badge_new(replies[0])
+
+        def event_for(user):
+            return self._event_cmds((event_name, user, {}))
+
+        def _added(results):
+            new = [user for user, ok in zip(users, results) if ok]
+            self._pipeline_many(new, event_for, _ignore_reply,
+                                lambda _: callback(results))
+        self._pipeline_many(users, add_for, added, _added)
+
+    def has_badge(self, user, badge, callback):
+        """Calls the callback with whether the user holds the badge"""
+        self._pipeline([self._badge_check_cmd(user, badge.badge_id)],
+                       lambda replies: callback(bool(replies[0])))
+
+    def badge_holders(self, badge, callback):
+        """Calls the callback with the number of users holding the badge
+
+        Needs the bitmap badge layout, where this is a single BITCOUNT.
+        """
+        self._require_bitmaps()
+        self._pipeline([("bitcount", (mkname("badge", badge.badge_id),))],
+                       lambda replies: callback(replies[0]))
+
+    def count_badge_holders(self, badges, op, callback):
+        """Counts the users in a combination of badges
+
+        op is a BITOP operation, "and" counting the users holding all
+        of the badges, "or" those holding any of them and "xor" those
+        holding an odd number of them. The combination is computed
+        server-side into a temporary key. Needs the bitmap badge
+        layout.
+        """
+        self._require_bitmaps()
+        dest = mkname("badge_op", uuid.uuid4().hex)
+        keys = [mkname("badge", badge.badge_id) for badge in badges]
+        cmds = [("bitop", (op.upper(), dest) + tuple(keys)),
+                ("bitcount", (dest,)),
+                ("delete", (dest,))]
+        self._pipeline(cmds, lambda replies: callback(replies[1]),
+                       transaction=True)
+
+    def _require_bitmaps(self):
+        if self.badge_layout != "bitmap":
+            raise ValueError("Counting badge holders needs the bitmap "
+                             "badge layout")
 
     def add_balance(self, user, currency, amount, callback):
-        self._counter_add(user,
-                          mkname("currency", currency.currency_id),
-                          amount, callback)
+        self._counter_award(user,
+                            mkname("currency", currency.currency_id),
+                            amount,
+                            ("currency.awarded." + currency.currency_id,
+                             dict(amount=amount)),
+                            callback)
 
     def deduct_balance(self, user, currency, amount, callback):
-        self.add_balance(user, currency, -amount, callback)
+        self._counter_award(user,
+                            mkname("currency", currency.currency_id),
+                            -amount,
+                            ("currency.deducted." + currency.currency_id,
+                             dict(amount=amount)),
+                            callback)
+
+    def spend_balance(self, user, currency, amount, callback):
+        if amount < 0:
+            raise ValueError("Can not spend a negative amount")
+        body = ("currency.deducted." + currency.currency_id, user,
+                dict(amount=amount))
+        hash_name, field = self._counter_location(
+            user, mkname("currency", currency.currency_id))
+
+        def _spent(res):
+            callback((bool(res[0]), parse_counter(res[1])))
+        self._eval_script("spend", [hash_name] + self._event_keys(user),
+                          [field, amount] + self._event_args(body), _spent)
+
+    def exchange(self, user, pay, receive, callback):
+        pay, receive = list(pay), list(receive)
+        if not pay + receive:
+            raise ValueError("Nothing to exchange")
+        if any(amount < 0 for _, amount in pay + receive):
+            raise ValueError("Can not exchange negative amounts")
+        for side in (pay, receive):
+            listed = [c.currency_id for c, _ in side]
+            if len(set(listed)) != len(listed):
+                raise ValueError("A currency may only be paid or received "
+                                 "once in an exchange")
+        ext = dict(pay=dict((c.currency_id, n) for c, n in pay),
+                   receive=dict((c.currency_id, n) for c, n in receive))
+        args = (self._event_args(("currency.exchanged", user, ext)) +
+                [len(pay), len(receive)])
+        for currency, amount in pay + receive:
+            # The currencies of a user share one hash in every layout
+            hash_name, field = self._counter_location(
+                user, mkname("currency", currency.currency_id))
+            args.extend([field, amount])
+        ids = [currency.currency_id for currency, _ in pay + receive]
+
+        def _cb(res):
+            callback((bool(res[0]),
+                      dict(zip(ids, [parse_counter(n) for n in res[1]]))))
+        self._eval_script("exchange", [hash_name] + self._event_keys(user),
+                          args, _cb)
+
+    def respond_schedule(self, user, key, rule, callback):
+        if rule[0] not in ("ratio", "interval"):
+            raise ValueError("Unknown schedule rule {0}".format(rule[0]))
+        hash_name, field = self._counter_location(
+            user, mkname("schedule", key))
+        self._eval_script("schedule", [hash_name],
+                          [field, rule[0]] + list(rule[1:]),
+                          lambda res: callback(parse_counter(res)))
+
+    def add_balance_many(self, awards, currency, callback):
+        self._counter_add_many(awards,
+                               mkname("currency", currency.currency_id),
+                               "currency.awarded." + currency.currency_id,
+                               callback)
 
     def get_balance(self, user, currency, callback):
         self._counter_get(user,
@@ -30,10 +609,7 @@ class RedisCommon(object):
                           callback)
 
     def track_event(self, event, subject=None, ext={}):
-        body = (event, subject, ext)
-
-        data = json.dumps(body)
-        self._add_to_ev(data, subject)
+        self._record((event, subject, ext))
 
     def get_points(self, user, points, callback):
         self._counter_get(user,
@@ -41,6 +617,209 @@ class RedisCommon(object):
                           callback=callback)
 
     def add_points(self, user, points, count, callback):
-        self._counter_add(user,
-                          mkname("points", points.points_id),
-                          count, callback=callback)
+        self._counter_award(user,
+                            mkname("points", points.points_id),
+                            count,
+                            ("point.awarded." + points.points_id,
+                             dict(amount=count)),
+                            callback,
+                            self._tallies(points))
+
+    def add_points_many(self, awards, points, callback):
+        self._counter_add_many(awards,
+                               mkname("points", points.points_id),
+                               "point.awarded." + points.points_id,
+                               callback,
+                               self._tallies(points))
+
+    def _window_key(self, kind, points, window, period):
+        if self.cluster:
+            raise ValueError("Leaderboards and windows span the keys of "
+                             "all users and are not supported in cluster "
+                             "mode")
+        return mkname(kind, points.points_id, window, period)
+
+    def _board(self, points):
+        """Returns the key of the leaderboard of a point system, if any
+
+        Takes either a point system or a window of one.
+        """
+        if not points.leaderboard:
+            return None
+        # Point systems have a window method, windows their name
+        window = getattr(points, "window", None)
+        if isinstance(window, string_types):
+            return self._window_key("leaderboard", points, window,
+                                    points.period)
+        if self.cluster:
+            raise ValueError("Leaderboards span the keys of all users and "
+                             "are not supported in cluster mode")
+        return mkname("leaderboard", points.points_id)
+
+    def _tallies(self, points):
+        """Returns the aggregates an award of points is added to
+
+        These are the leaderboard and for each window of the point
+        system a hash of the points of the current period, and its
+        leaderboard, as (command, key, expiry time) tuples.
+        """
+        tallies = list()
+        if points.leaderboard:
+            tallies.append(("zincrby", self._board(points), None))
+        now = time.time()
+        for window in points.windows:
+            period, _ = operant.windows.period(window, now)
+            expire_at = operant.windows.expiry(window, now,
+                                               self.window_retention)
+            tallies.append(("hincrby", self._window_key(
+                "window", points, window, period), expire_at))
+            if points.leaderboard:
+                tallies.append(("zincrby", self._window_key(
+                    "leaderboard", points, window, period), expire_at))
+        return tallies
+
+    def get_window_points(self, user, window, callback):
+        """Calls the callback with the points of a user in a window"""
+        key = self._window_key("window", window, window.window,
+                               window.period)
+        self._pipeline([("hget", (key, user_id(user)))],
+                       lambda replies: callback(parse_counter(replies[0])))
+
+    def _board_key(self, points):
+        board = self._board(points)
+        if board is None:
+            raise ValueError("The point system {0} has no leaderboard"
+                             .format(points.points_id))
+        return board
+
+    def _entries(self, start, replies):
+        entries = list()
+        for i, (member, score) in enumerate(replies):
+            score = parse_counter(score)
+            if isinstance(score, float) and score.is_integer():
+                score = int(score)
+            entries.append((start + i, _text(member), score))
+        return entries
+
+    def leaderboard_top(self, points, n, callback):
+        """Calls the callback with the n highest ranked users
+
+        The entries are (rank, user id, points) tuples, ranks starting
+        at 0 with the user with the most points.
+        """
+        if n <= 0:
+            callback([])
+            return
+        self._pipeline([("zrevrange", (self._board_key(points), 0, n - 1,
+                                       True))],
+                       lambda replies: callback(self._entries(0,
+                                                              replies[0])))
+
+    def leaderboard_rank(self, user, points, callback):
+        """Calls the callback with the rank of a user, None if unranked"""
+        self._pipeline([("zrevrank", (self._board_key(points),
+                                      user_id(user)))],
+                       lambda replies: callback(replies[0]))
+
+    def leaderboard_around(self, user, points, k, callback):
+        """Calls the callback with the users ranked around a user
+
+        Gives the entries, as returned by leaderboard_top, of the k
+        users ranked above and below the user along with the user's
+        own. The list is empty if the user is unranked.
+        """
+        board = self._board_key(points)
+
+        def _ranked(replies):
+            rank = replies[0]
+            if rank is None:
+                callback([])
+                return
+            start = max(rank - k, 0)
+            self._pipeline([("zrevrange", (board, start, rank + k, True))],
+                           lambda replies: callback(
+                               self._entries(start, replies[0])))
+        self._pipeline([("zrevrank", (board, user_id(user)))], _ranked)
+
+
+@interface.implementer(operant.data.IStorageProvider)
+class RedisBatch(RedisCommon):
+    """Unit of work coalescing storage calls into a single pipeline
+
+    The batch records the commands of every call made against it and
+    sends them through the store it was created from on execute, or
+    when used as a context manager on leaving the with block. The
+    callbacks are then fired in the order of the calls with their
+    replies. Calls made from those callbacks go out in a following
+    pipeline.
+
+    Awards record their events in the same pipeline, badges by
+    running the award script with EVAL, so they complete in one
+    round trip.
+    """
+
+    def __init__(self, store, transaction=True):
+        # Share the options of the store, commands are built the same way
+        self.__dict__.update(store.__dict__)
+        self.scripts = False
+        self._store = store
+        self._transaction = transaction
+        self._queued = list()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.execute()
+        else:
+            self._queued = list()
+        return False
+
+    def _queue(self, cmds, handler):
+        self._queued.append((cmds, handler))
+
+    def execute(self):
+        """Sends the recorded calls and fires their callbacks"""
+        if not self._queued:
+            return
+        queued, self._queued = self._queued, list()
+        cmds = list(chain.from_iterable(c for c, _ in queued))
+
+        def _dispatch(replies):
+            pos = 0
+            for c, handler in queued:
+                handler(replies[pos:pos + len(c)])
+                pos += len(c)
+            self.execute()
+        self._store._pipeline(cmds, _dispatch, self._transaction)
+
+    def _pipeline(self, cmds, callback, transaction=False):
+        self._queue(cmds, callback)
+
+    def _eval_script(self, name, keys, args, callback):
+        # EVAL as a script can not be loaded in the middle of a pipeline
+        cmd = ("EVAL", redis_scripts.SCRIPTS[name], len(keys))
+        self._queue([("execute_command", cmd + tuple(keys + args))],
+                    lambda replies: callback(replies[0]))
+
+    def add_badge(self, user, badge, callback):
+        self._badge_add_script(user, badge, callback)
+
+    def _counter_add(self, user, counter, amount, callback):
+        hash_name, field = self._counter_location(user, counter)
+        self._queue([("hincrby", (hash_name, field, amount))],
+                    lambda replies: callback(replies[0]))
+
+    def _counter_award(self, user, counter, amount, event, callback,
+                       tallies=()):
+        name, ext = event
+        body = (name, user, ext)
+        cmds = (self._counter_cmds(user, counter, amount, tallies) +
+                self._event_cmds(body))
+        self._queue(cmds, lambda replies: callback(replies[0]))
+
+    def _counter_get(self, user, counter, callback):
+        hash_name, field = self._counter_location(user, counter)
+        self._queue([("hget", (hash_name, field))],
+                    lambda replies: callback(parse_counter(replies[0])))
@@ -0,0 +1,137 @@
+"""Module for recording events in the background
+
+Used by the plain redis storage provider with its event_buffer option
+to take tracking events off the path of the calls making them.
+"""
+from __future__ import (with_statement, print_function,
+                        division, absolute_import)
+import atexit
+import threading
+import time
+
+from six.moves import queue
+
+_STOP = object()
+
+
+class EventBuffer(object):
+    """Bounded queue of events written by a background thread
+
+    Items put in the buffer are passed to flush in lists of at most
+    flush_size items, once that many are queued or flush_interval
+    seconds after the first of them was. When the queue holds maxsize
+    items put waits up to block_timeout seconds for room, slowing down
+    the callers, before dropping the item. Items that flush raises an
+    exception for are dropped as well.
+
+    The thread is a daemon, the remaining items are flushed by close,
+    which is called on interpreter exit unless called before.
+    """
+
+    def __init__(self, flush, maxsize=10000, flush_size=1000,
+                 flush_interval=1.0, block_timeout=1.0):
+        self._flush = flush
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.block_timeout = block_timeout
+        self.flushed = 0
+        self.dropped = 0
+        self._lock = threading.Lock()
+        # Close waits for the puts under way, so nothing follows the stop
+        self._putting = 0
+        self._idle = threading.Condition(self._lock)
+        self._queue = queue.Queue(maxsize)
+        self._closed = False
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run,
+                                        name="operant-event-buffer")
+        self._thread.daemon = True
+        self._thread.start()
+        atexit.register(self.close)
+
+    def put(self, item):
+        """Queues an item, returning False if it was dropped"""
+        with self._lock:
+            if self._closed:
+                self.dropped += 1
+                return False
+            self._putting += 1
+        try:
+            self._queue.put(item, self.block_timeout != 0,
+                            self.block_timeout)
+            return True
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+        finally:
+            with self._lock:
+                self._putting -= 1
+                if not self._putting:
+                    self._idle.notify_all()
+
+    def _take(self):
+        """Waits for the items of the next flush, None once stopped"""
+        if self._stopping:
+            return None
+        item = self._queue.get()
+        if item is _STOP:
+            self._queue.task_done()
+            return None
+        items = [item]
+        deadline = time.time() + self.flush_interval
+        while len(items) < self.flush_size:
+            timeout = deadline - time.time()
+            if timeout <= 0:
+                break
+            try:
+                item = self._queue.get(True, timeout)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                # Stops on the next call, once these are flushed
+                self._queue.task_done()
+                self._stopping = True
+                break
+            items.append(item)
+        return items
+
+    def _run(self):
+        while True:
+            items = self._take()
+            if items is None:
+                return
+            try:
+                self._flush(items)
+                with self._lock:
+                    self.flushed += len(items)
+            except Exception:
+                with self._lock:
+                    self.dropped += len(items)
+            finally:
+                for _ in items:
+                    self._queue.task_done()
+
+    def flush(self):
+        """Waits until every item queued so far has been flushed"""
+        self._queue.join()
+
+    def close(self):
+        """Flushes the remaining items and stops the thread"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            while self._putting:
+                self._idle.wait()
+        self._queue.put(_STOP)
+        self._thread.join()
+        if hasattr(atexit, "unregister"):
+            # Lets the buffer and the store it flushes to be collected
+            atexit.unregister(self.close)
+
+    def stats(self):
+        """Returns a dict of the flushed, dropped and queued items"""
+        with self._lock:
+            return dict(flushed=self.flushed, dropped=self.dropped,
+                        queued=self._queue.qsize())
@@ -0,0 +1,84 @@
+"""Codecs encoding the events recorded by the redis storage providers
+
+An event body is an (event, subject, ext) tuple, followed by the time
+it was recorded in partitioned event logs. Codecs have an encode
+method turning a body into the string or bytes stored in the event
+logs and a decode method turning it back into a list. Pass a codec to
+the provider using its codec option and its decode method to the
+readers in operant.storage.events.
+"""
+from __future__ import (with_statement, print_function,
+                        division, absolute_import)
+import json
+
+from six import integer_types, string_types
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# The names of the events and event data recorded by operant itself
+EVENT_SYMBOLS = ("point.awarded", "currency.awarded", "currency.deducted",
+                 "badge.awarded", "amount")
+
+
+class JSONCodec(object):
+    """The default codec, storing events as JSON arrays"""
+
+    def encode(self, body):
+        return json.dumps(body)
+
+    def decode(self, data):
+        return json.loads(data)
+
+
+class MsgpackCodec(object):
+    """Codec storing events as msgpack arrays with interned names
+
+    The event name is split at its last dot into its kind, such as
+    point.awarded, and the id of the point system, currency or badge.
+    Both, as well as the keys of the event data, are stored as their
+    index in the symbol table if they are in it and as is otherwise.
+    The table starts with EVENT_SYMBOLS followed by the passed in
+    symbols, typically the ids of the registered point systems,
+    currencies and badges. As the index is what is stored symbols may
+    only ever be appended to the table. The keys of the event data
+    must be strings, as integers would be read back as symbols.
+    """
+
+    def __init__(self, symbols=()):
+        if msgpack is None:
+            raise ImportError("You need to install the msgpack package to "
+                              "use the msgpack codec")
+        self.symbols = EVENT_SYMBOLS + tuple(symbols)
+        self._ids = dict((s, i) for i, s in enumerate(self.symbols))
+        if len(self._ids) != len(self.symbols):
+            raise ValueError("The symbols of a codec must be unique")
+
+    def _intern(self, s):
+        return self._ids.get(s, s)
+
+    def _lookup(self, v):
+        if isinstance(v, integer_types):
+            return self.symbols[v]
+        return v
+
+    def encode(self, body):
+        event, subject, ext = body[:3]
+        kind, _, name = event.rpartition(".")
+        if not all(isinstance(k, string_types) for k in ext):
+            raise ValueError("The msgpack codec needs string event data "
+                             "keys")
+        ext = dict((self._intern(k), v) for k, v in ext.items())
+        return msgpack.packb([self._intern(kind), self._intern(name),
+                              subject, ext] + list(body[3:]),
+                             use_bin_type=True)
+
+    def decode(self, data):
+        body = msgpack.unpackb(data, raw=False, strict_map_key=False)
+        kind, name, subject, ext = body[:4]
+        kind, name = self._lookup(kind), self._lookup(name)
+        event = kind + "." + name if kind else name
+        ext = dict((self._lookup(k), v) for k, v in ext.items())
+        return [event, subject, ext] + body[4:]
@@ -0,0 +1,88 @@
+"""Rules deciding which events are recorded and where
+
+Rules are given as a dict from dotted event name prefixes to actions,
+the rule of the longest matching prefix applies to an event:
+
+    EventRules({"point.awarded.experience": 0.1,
+                "currency": "keep",
+                "debug": "drop",
+                "login": "user"})
+
+A prefix matches whole parts of the name, "point.awarded" matches
+point.awarded.xp but not point.awardedx, and may end in ".*". The
+empty prefix, or "*", sets the action of events matching no other
+rule, "keep" by default. The actions are:
+
+keep -- Record the event in the global and the user's event log.
+drop -- Do not record the event.
+global -- Only record the event in the global event log.
+user -- Only record the event in the user's event log.
+a number p -- Record a random sample of a fraction p of the events.
+"""
+from __future__ import (with_statement, print_function,
+                        division, absolute_import)
+import random
+
+from six import string_types
+
+_ROUTES = {"keep": (True, True), "drop": (False, False),
+           "global": (True, False), "user": (False, True)}
+
+
+class EventRules(object):
+    """Prefix trie of event rules, see the module documentation
+
+    rng is the random.Random used for sampling.
+    """
+
+    def __init__(self, rules, rng=None):
+        self._rng = rng if rng is not None else random.Random()
+        self._root = [_ROUTES["keep"], dict()]
+        for prefix, action in rules.items():
+            node = self._root
+            for part in self._parts(prefix):
+                node = node[1].setdefault(part, [None, dict()])
+            node[0] = self._compile(action)
+
+    @staticmethod
+    def _parts(prefix):
+        if prefix.endswith(".*"):
+            prefix = prefix[:-2]
+        if prefix in ("", "*"):
+            return []
+        return prefix.split(".")
+
+    @staticmethod
+    def _compile(action):
+        if isinstance(action, string_types):
+            try:
+                return _ROUTES[action]
+            except KeyError:
+                raise ValueError("Unknown event rule action {0}"
+                                 .format(action))
+        if not 0 <= action <= 1:
+            raise ValueError("Sampling rates must be between 0 and 1")
+        return float(action)
+
+    def action(self, event):
+        """Returns the compiled action of the rule matching an event"""
+        node = self._root
+        action = node[0]
+        for part in event.split("."):
+            node = node[1].get(part)
+            if node is None:
+                break
+            if node[0] is not None:
+                action = node[0]
+        return action
+
+    def route(self, event):
+        """Returns whether to record an event globally and for the user
+
+        Sampled events are either recorded in both logs or in neither.
+        """
+        action = self.action(event)
+        if isinstance(action, float):
+            keep = self._rng.random() < action
+            return (keep, keep)
+        return action
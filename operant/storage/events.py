@@ -0,0 +1,176 @@
+"""Module for reading back the event logs
+
+Events recorded with the stream event log (event_log="stream") can be
+consumed using a redis consumer group, letting any number of workers
+share the work of processing them. Partitioned list logs can be read
+back in the order the events were recorded using merged.
+"""
+import heapq
+import json
+
+try:
+    import redis
+except ImportError:
+    raise ImportError("You need to install the redis python package to"
+                      "use this storage module")
+
+
+def _field(fields, name):
+    if name in fields:
+        return fields[name]
+    return fields.get(name.encode("utf-8"))
+
+
+def _list_items(client, key, page):
+    # Events are pushed to the head of the list, counting from the
+    # tail keeps the indexes of the events in the snapshot in place
+    length = client.llen(key)
+    start = 0
+    while start < length:
+        end = min(start + page, length) - 1
+        items = client.lrange(key, start - length, end - length)
+        for item in items:
+            yield item
+        start += len(items)
+        if not items:
+            return
+
+
+def _list_pages(client, key, page, decode, capped):
+    if capped:
+        # Trimming moves the tail as well, so there is no index that
+        # stays in place and the whole log is read at once
+        items = client.lrange(key, 0, -1)
+    else:
+        items = _list_items(client, key, page)
+    for index, item in enumerate(items):
+        event = decode(item)
+        # Newest first, the index breaks ties between partitions
+        yield (-event[3] if len(event) > 3 else 0, key, index, event)
+
+
+def merged(client, keys, page=1000, decode=json.loads, capped=False):
+    """Generator yielding the events of partitioned event logs, newest first
+
+    Takes the keys of the partitions, as returned by the
+    global_event_keys method of the redis storage providers, and
+    merges them by the time the events were recorded. Each partition
+    is read lazily page entries at a time, taking the events it holds
+    when reading starts. Events recorded since are not yielded. Events
+    are (event, subject, ext, time) lists.
+
+    Pass capped for logs capped by max_events, trimming them while
+    reading would otherwise repeat events. Each partition of a capped
+    log is then read whole when it is first needed.
+
+    The cluster layout has a shard per hash slot, reading it takes at
+    least one round trip for each of the 16384 shards.
+    """
+    if isinstance(client, dict):
+        client = redis.StrictRedis(**client)
+    pages = [_list_pages(client, key, page, decode, capped)
+             for key in keys]
+    for _, _, _, event in heapq.merge(*pages):
+        yield event
+
+
+class StreamConsumer(object):
+    """Consumes events from stream event logs as part of a consumer group
+
+    Events are read in batches of count entries using XREADGROUP and
+    acknowledged in bulk using XACK once the whole batch has been
+    consumed, meaning that events that were being processed when a
+    worker died are delivered again when it restarts with the same
+    consumer name.
+
+    block is the number of milliseconds to wait for new events, if it
+    is None consuming stops once there are no more events.
+    """
+
+    def __init__(self, client, group, consumer, streams=("events",),
+                 count=1000, block=None, decode=json.loads):
+        if isinstance(client, dict):
+            client = redis.StrictRedis(**client)
+        self.client = client
+        self.group = group
+        self.consumer = consumer
+        self.streams = list(streams)
+        self.count = count
+        self.block = block
+        self.decode = decode
+
+    def create_group(self, start="0"):
+        """Creates the consumer group unless it already exists
+
+        By default the group starts with the first event in the
+        streams, pass "$" to only consume events added from now on.
+        """
+        for stream in self.streams:
+            try:
+                self.client.xgroup_create(stream, self.group, start,
+                                          mkstream=True)
+            except redis.exceptions.ResponseError as e:
+                if "BUSYGROUP" not in str(e):
+                    raise
+
+    def read(self, start=">"):
+        """Reads a batch of entries as (stream, entry id, event) tuples
+
+        Passing an entry id such as "0" as start reads the entries
+        delivered to this consumer but never acknowledged.
+        """
+        replies = self.client.xreadgroup(
+            self.group, self.consumer,
+            dict((stream, start) for stream in self.streams),
+            count=self.count,
+            block=self.block if start == ">" else None)
+
+        entries = list()
+        for stream, items in replies or ():
+            for entry_id, fields in items:
+                if not fields:
+                    # Pending entries that have since been trimmed away
+                    entries.append((stream, entry_id, None))
+                    continue
+                event = self.decode(_field(fields, "data"))
+                entries.append((stream, entry_id, event))
+        return entries
+
+    def ack(self, entries):
+        """Acknowledges the passed in entries with one XACK per stream"""
+        by_stream = dict()
+        for stream, entry_id, _ in entries:
+            by_stream.setdefault(stream, list()).append(entry_id)
+        if not by_stream:
+            return
+        pipe = self.client.pipeline(transaction=False)
+        for stream, ids in by_stream.items():
+            pipe.xack(stream, self.group, *ids)
+        pipe.execute()
+
+    def batches(self):
+        """Generator yielding batches of entries as returned by read
+
+        A batch is acknowledged when the next one is requested. Entries
+        left unacknowledged by an earlier run are yielded first.
+        """
+        self.create_group()
+        start = "0"
+        while True:
+            entries = self.read(start)
+            if not entries:
+                if start != ">":
+                    start = ">"
+                    continue
+                if self.block is None:
+                    return
+                continue
+            yield entries
+            self.ack(entries)
+
+    def events(self):
+        """Generator yielding the events as (event, subject, ext) tuples"""
+        for entries in self.batches():
+            for _, _, event in entries:
+                if event is not None:
+                    yield event
@@ -0,0 +1,253 @@
+"""Module for in-process memory storage
+
+Suitable for single-node deployments, load tests and testing. Each
+user is kept as a small record: counters in an array indexed by an
+interned counter id, badges as the bits of an integer and the most
+recent events in a capped deque that is only created once needed.
+"""
+from __future__ import (with_statement, print_function,
+                        division, absolute_import)
+import threading
+from array import array
+from collections import deque
+
+import zope.interface as interface
+from six.moves import intern
+
+import operant.data
+
+try:
+    array("q")
+    _COUNTER_TYPE = "q"
+except ValueError:
+    # Python 2 lacks long long arrays
+    _COUNTER_TYPE = "l"
+
+
+class _UserRecord(object):
+    __slots__ = ("counters", "badges", "events")
+
+    def __init__(self):
+        self.counters = array(_COUNTER_TYPE)
+        self.badges = 0
+        self.events = None
+
+
+@interface.implementer(operant.data.IStorageProvider)
+class Memory(object):
+    """Storage provider keeping everything in memory
+
+    All operations are thread-safe and call their callbacks
+    synchronously. Events are kept newest first in a global log of at
+    most max_events and per-user logs of at most max_user_events.
+    event_rules, an operant.storage.event_rules.EventRules, decides
+    which events are kept and in which logs.
+    """
+    records_award_events = False
+
+    def __init__(self, max_events=10000, max_user_events=100,
+                 event_rules=None):
+        self.max_events = max_events
+        self.max_user_events = max_user_events
+        self.event_rules = event_rules
+        self._lock = threading.Lock()
+        self._users = dict()
+        self._counter_ids = dict()
+        self._badge_bits = dict()
+        self._events = deque(maxlen=max_events)
+
+    def _record(self, user):
+        rec = self._users.get(user)
+        if rec is None:
+            if type(user) is str:
+                user = intern(user)
+            rec = self._users[user] = _UserRecord()
+        return rec
+
+    def _counter_id(self, counter):
+        i = self._counter_ids.get(counter)
+        if i is None:
+            i = self._counter_ids[counter] = len(self._counter_ids)
+        return i
+
+    def _badge_bit(self, badge_id):
+        bit = self._badge_bits.get(badge_id)
+        if bit is None:
+            bit = self._badge_bits[badge_id] = 1 << len(self._badge_bits)
+        return bit
+
+    def _add(self, user, counter, amount):
+        i = self._counter_id(counter)
+        counters = self._record(user).counters
+        if i >= len(counters):
+            counters.extend([0] * (i + 1 - len(counters)))
+        counters[i] += amount
+        return counters[i]
+
+    def _get(self, user, counter):
+        rec = self._users.get(user)
+        i = self._counter_ids.get(counter)
+        if rec is None or i is None or i >= len(rec.counters):
+            return 0
+        return rec.counters[i]
+
+    def _add_badge(self, user, badge_id):
+        bit = self._badge_bit(badge_id)
+        rec = self._record(user)
+        if rec.badges & bit:
+            return False
+        rec.badges |= bit
+        return True
+
+    def _track(self, event, subject, ext):
+        body = (event, subject, ext)
+        to_global, to_user = (True, True)
+        if self.event_rules is not None:
+            to_global, to_user = self.event_rules.route(event)
+        if to_global:
+            self._events.appendleft(body)
+        if to_user and subject is not None:
+            rec = self._record(subject)
+            if rec.events is None:
+                rec.events = deque(maxlen=self.max_user_events)
+            rec.events.appendleft(body)
+
+    def add_badge(self, user, badge, callback):
+        with self._lock:
+            success = self._add_badge(user, badge.badge_id)
+        callback(success)
+
+    def add_badge_many(self, users, badge, callback):
+        event = "badge.awarded." + badge.badge_id
+        results = list()
+        with self._lock:
+            for user in users:
+                success = self._add_badge(user, badge.badge_id)
+                if success:
+                    self._track(event, user, {})
+                results.append(success)
+        callback(results)
+
+    def track_event(self, event, subject=None, ext={}):
+        with self._lock:
+            self._track(event, subject, ext)
+
+    def _counter_add_many(self, awards, counter, event, callback):
+        results = list()
+        with self._lock:
+            for user, amount in awards:
+                results.append(self._add(user, counter, amount))
+                self._track(event, user, dict(amount=amount))
+        callback(results)
+
+    def add_balance(self, user, currency, amount, callback):
+        with self._lock:
+            res = self._add(user, ("currency", currency.currency_id), amount)
+        callback(res)
+
+    def add_balance_many(self, awards, currency, callback):
+        self._counter_add_many(awards, ("currency", currency.currency_id),
+                               "currency.awarded." + currency.currency_id,
+                               callback)
+
+    def deduct_balance(self, user, currency, amount, callback):
+        self.add_balance(user, currency, -amount, callback)
+
+    def spend_balance(self, user, currency, amount, callback):
+        if amount < 0:
+            raise ValueError("Can not spend a negative amount")
+        counter = ("currency", currency.currency_id)
+        with self._lock:
+            balance = self._get(user, counter)
+            success = balance >= amount
+            if success:
+                balance = self._add(user, counter, -amount)
+        callback((success, balance))
+
+    def exchange(self, user, pay, receive, callback):
+        pay, receive = list(pay), list(receive)
+        if not pay + receive:
+            raise ValueError("Nothing to exchange")
+        if any(amount < 0 for _, amount in pay + receive):
+            raise ValueError("Can not exchange negative amounts")
+        for side in (pay, receive):
+            listed = [c.currency_id for c, _ in side]
+            if len(set(listed)) != len(listed):
+                raise ValueError("A currency may only be paid or received "
+                                 "once in an exchange")
+        with self._lock:
+            success = all(
+                self._get(user, ("currency", c.currency_id)) >= amount
+                for c, amount in pay)
+            if success:
+                for c, amount in pay:
+                    self._add(user, ("currency", c.currency_id), -amount)
+                for c, amount in receive:
+                    self._add(user, ("currency", c.currency_id), amount)
+                self._track("currency.exchanged", user, dict(
+                    pay=dict((c.currency_id, n) for c, n in pay),
+                    receive=dict((c.currency_id, n) for c, n in receive)))
+            balances = dict((c.currency_id,
+                             self._get(user, ("currency", c.currency_id)))
+                            for c, _ in pay + receive)
+        callback((success, balances))
+
+    def respond_schedule(self, user, key, rule, callback):
+        counter = ("schedule", key)
+        with self._lock:
+            if rule[0] == "ratio":
+                n = self._add(user, counter, 1)
+                reward = rule[1] if n > 0 and n % rule[2] == 0 else 0
+            elif rule[0] == "interval":
+                _, reward, now, threshold, offset = rule
+                last = self._get(user, counter)
+                if now - last >= threshold:
+                    self._add(user, counter, now + offset - last)
+                else:
+                    reward = 0
+            else:
+                raise ValueError("Unknown schedule rule {0}".format(rule[0]))
+        callback(reward)
+
+    def get_balance(self, user, currency, callback):
+        with self._lock:
+            res = self._get(user, ("currency", currency.currency_id))
+        callback(res)
+
+    def add_points(self, user, points, amount, callback):
+        with self._lock:
+            res = self._add(user, ("points", points.points_id), amount)
+        callback(res)
+
+    def add_points_many(self, awards, points, callback):
+        self._counter_add_many(awards, ("points", points.points_id),
+                               "point.awarded." + points.points_id,
+                               callback)
+
+    def get_points(self, user, points, callback):
+        with self._lock:
+            res = self._get(user, ("points", points.points_id))
+        callback(res)
+
+    def events(self, user=None):
+        """Returns the recorded events, newest first
+
+        Returns the events of the passed in user or if None the events
+        of all users. Events are (event, subject, ext) tuples.
+        """
+        with self._lock:
+            if user is None:
+                return list(self._events)
+            rec = self._users.get(user)
+            if rec is None or rec.events is None:
+                return []
+            return list(rec.events)
+
+    def badges(self, user):
+        """Returns the ids of the badges the passed in user has"""
+        with self._lock:
+            rec = self._users.get(user)
+            if rec is None:
+                return []
+            return [badge_id for badge_id, bit in self._badge_bits.items()
+                    if rec.badges & bit]
@@ -0,0 +1,74 @@
+"""Tool for moving redis data to the bucketed key layout
+
+Moves the per-user counter hashes and badge sets into the bucket
+hashes used with layout="bucketed". Each user is moved atomically by a
+server-side script and their old key is deleted, so the migration can
+be interrupted and run again and may run while awards are made using
+the bucketed layout. Run it using:
+
+    python -m operant.storage.migrate --host localhost --bucket-size 32
+"""
+from __future__ import (with_statement, print_function,
+                        division, absolute_import)
+import argparse
+
+from six import binary_type
+
+from operant.storage.plain_redis import Redis
+
+
+def _moves(client, kind, count):
+    prefix = kind + ":"
+    for key in client.scan_iter(match=prefix + "*", count=count):
+        if isinstance(key, binary_type):
+            key = key.decode("utf-8")
+        uid = key[len(prefix):]
+        # Skip buckets and keys of users without integer ids
+        if uid.isdigit():
+            yield key, uid
+
+
+def migrate_to_buckets(client, bucket_size=32, count=1000):
+    """Moves counters and badges of every user into bucket hashes
+
+    Returns a dict with the number of users whose counters and badges
+    were moved. The bucket_size must match the one the storage
+    provider is created with.
+    """
+    store = Redis(client, layout="bucketed", bucket_size=bucket_size)
+    moved = dict(counter=0, badges=0)
+
+    def _moved(kind):
+        def _cb(_):
+            moved[kind] += 1
+        return _cb
+
+    for key, uid in _moves(client, "counter", count):
+        bucket, _ = store._counter_location(uid, "")
+        store._eval_script("migrate_counters", [key, bucket], [uid],
+                           _moved("counter"))
+
+    for key, uid in _moves(client, "badges", count):
+        _, (bucket, _, _) = store._badge_cmd(uid, "")
+        store._eval_script("migrate_badges", [key, bucket], [uid],
+                           _moved("badges"))
+    return moved
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Moves operant data to the bucketed key layout")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=6379)
+    parser.add_argument("--db", type=int, default=0)
+    parser.add_argument("--bucket-size", type=int, default=32)
+    args = parser.parse_args(argv)
+
+    import redis
+    client = redis.StrictRedis(host=args.host, port=args.port, db=args.db)
+    moved = migrate_to_buckets(client, args.bucket_size)
+    print("Moved the counters of {0} and the badges of {1} users"
+          .format(moved["counter"], moved["badges"]))
+
+if __name__ == "__main__":
+    main()
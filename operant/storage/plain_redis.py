@@ -8,53 +8,81 @@ except ImportError:
                       "use this storage module")
 
 import operant.data
-from operant.storage.common_redis import mkname, user_id, RedisCommon
-
-from six import string_types
+from operant.storage import redis_scripts
+from operant.storage.common_redis import parse_counter, RedisCommon, _ignore
+from operant.storage.event_buffer import EventBuffer
 
 
 @interface.implementer(operant.data.IStorageProvider)
 class Redis(RedisCommon):
+    """Storage provider using redis-py
+
+    Takes a redis client or a dict of options for one. Passing
+    event_buffer, True or a dict of options for an EventBuffer, makes
+    track_event queue the events for a background thread that records
+    them in pipelines of many events. Call close, or flush, to make
+    sure they have been recorded.
+    """
 
-    def __init__(self, client):
+    def __init__(self, client, event_buffer=None, **kwargs):
         if isinstance(client, dict):
             client = redis.StrictRedis(**client)
         self.client = client
+        super(Redis, self).__init__(**kwargs)
+        if event_buffer:
+            options = event_buffer if isinstance(event_buffer, dict) else {}
+            event_buffer = EventBuffer(self._record_events, **options)
+        self.event_buffer = event_buffer or None
+
+    def _add_to_ev(self, cmds):
+        if self.event_buffer is None:
+            super(Redis, self)._add_to_ev(cmds)
+        else:
+            self.event_buffer.put(cmds)
 
-    def add_badge(self, user, badge, callback):
-        key = mkname("badges", user_id(user))
-        success = self.client.sadd(key, badge.badge_id) == 1
-        callback(success)
+    def _record_events(self, items):
+        self._pipeline([cmd for cmds in items for cmd in cmds], _ignore)
 
-    def _add_to_ev(self, data, subject):
-        gkey = mkname("events")
-        pkey = mkname("events", user_id(subject))
+    def flush(self):
+        """Waits until the buffered events have been recorded"""
+        if self.event_buffer is not None:
+            self.event_buffer.flush()
 
-        pipe = self.client.pipeline()
+    def close(self):
+        """Records the buffered events and stops the buffer's thread"""
+        if self.event_buffer is not None:
+            self.event_buffer.close()
 
-        pipe.lpush(gkey, data)
-        pipe.lpush(pkey, data)
+    def _badge_add(self, user, badge, callback):
+        name, args = self._badge_cmd(user, badge.badge_id)
+        success = self._badge_new(getattr(self.client, name)(*args))
+        callback(success)
 
-        pipe.execute()
+    def _pipeline(self, cmds, callback, transaction=False):
+        pipe = self.client.pipeline(transaction=transaction)
+        for name, args in cmds:
+            getattr(pipe, name)(*args)
+        callback(pipe.execute())
+
+    def _eval_script(self, name, keys, args, callback):
+        sha = redis_scripts.SHAS[name]
+        try:
+            res = self.client.evalsha(sha, len(keys), *(keys + args))
+        except redis.exceptions.NoScriptError:
+            self.client.script_load(redis_scripts.SCRIPTS[name])
+            res = self.client.evalsha(sha, len(keys), *(keys + args))
+        callback(res)
 
     def _counter_add(self, user, counter, amount, callback):
-        hash_name = mkname("counter", user_id(user))
+        hash_name, field = self._counter_location(user, counter)
 
-        res = self.client.hincrby(hash_name, counter, amount)
+        res = self.client.hincrby(hash_name, field, amount)
 
         callback(res)
 
     def _counter_get(self, user, counter, callback):
-        hash_name = mkname("counter", user_id(user))
+        hash_name, field = self._counter_location(user, counter)
 
-        res = self.client.hget(hash_name, counter)
+        res = self.client.hget(hash_name, field)
 
-        if isinstance(res, string_types):
-            try:
-                callback(int(res))
-            except ValueError:
-                callback(float(res))
-        elif res is None:
-            callback(0)
-        else:
-            callback(res)
+        callback(parse_counter(res))
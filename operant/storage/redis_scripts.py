@@ -0,0 +1,186 @@
+"""Lua scripts run server-side by the redis storage implementations
+
+Scripts are referred to by name and invoked with EVALSHA, their
+digests are computed once when this module is loaded. Implementations
+only load a script (SCRIPT LOAD) when the server replies NOSCRIPT.
+"""
+import hashlib
+
+# Records an event, ARGV[i] being the encoded event followed by the
+# kind of log, the length caps of the global and user logs, the TTL
+# of the user log and the logs to record it in, "g" for the global and
+# "u" for the user's. Zero means no cap or TTL.
+RECORD_EVENT = """
+local function push(key, data, stream, max)
+    if stream then
+        if max > 0 then
+            redis.call("XADD", key, "MAXLEN", "~", max, "*", "data", data)
+        else
+            redis.call("XADD", key, "*", "data", data)
+        end
+    else
+        redis.call("LPUSH", key, data)
+        if max > 0 then
+            redis.call("LTRIM", key, 0, max - 1)
+        end
+    end
+end
+
+local function record_event(gkey, pkey, i)
+    local stream = ARGV[i + 1] == "stream"
+    local targets = ARGV[i + 5]
+    if string.find(targets, "g", 1, true) then
+        push(gkey, ARGV[i], stream, tonumber(ARGV[i + 2]))
+    end
+    if string.find(targets, "u", 1, true) then
+        push(pkey, ARGV[i], stream, tonumber(ARGV[i + 3]))
+        local ttl = tonumber(ARGV[i + 4])
+        if ttl > 0 then
+            redis.call("EXPIRE", pkey, ttl)
+        end
+    end
+end
+"""
+
+# KEYS: counter hash, global event log, user event log, tallies...
+# ARGV: counter, amount, event..., user id and for each tally "zincrby"
+#       or "hincrby" and the time it expires at or 0
+COUNTER_ADD = RECORD_EVENT + """
+local n = redis.call("HINCRBY", KEYS[1], ARGV[1], ARGV[2])
+record_event(KEYS[2], KEYS[3], 3)
+for j = 4, #KEYS do
+    local i = 10 + (j - 4) * 2
+    if ARGV[i] == "zincrby" then
+        redis.call("ZINCRBY", KEYS[j], ARGV[2], ARGV[9])
+    else
+        redis.call("HINCRBY", KEYS[j], ARGV[9], ARGV[2])
+    end
+    local expire_at = tonumber(ARGV[i + 1])
+    if expire_at > 0 then
+        redis.call("EXPIREAT", KEYS[j], expire_at)
+    end
+end
+return n
+"""
+
+# KEYS: badge set, bucket hash or bitmap, global event log, user event log
+# ARGV: "sadd" and badge id, "hsetnx" and bucket field or "setbit" and
+#       user index, event...
+BADGE_ADD = RECORD_EVENT + """
+local added
+if ARGV[1] == "hsetnx" then
+    added = redis.call("HSETNX", KEYS[1], ARGV[2], 1)
+elseif ARGV[1] == "setbit" then
+    -- SETBIT replies with the previous value of the bit
+    added = 1 - redis.call("SETBIT", KEYS[1], ARGV[2], 1)
+else
+    added = redis.call("SADD", KEYS[1], ARGV[2])
+end
+if added == 1 then
+    record_event(KEYS[2], KEYS[3], 3)
+end
+return added
+"""
+
+# KEYS: counter hash, global event log, user event log
+# ARGV: counter, amount, event...
+SPEND = RECORD_EVENT + """
+local balance = tonumber(redis.call("HGET", KEYS[1], ARGV[1]) or "0")
+local amount = tonumber(ARGV[2])
+if balance < amount then
+    return {0, balance}
+end
+balance = redis.call("HINCRBY", KEYS[1], ARGV[1], -amount)
+record_event(KEYS[2], KEYS[3], 3)
+return {1, balance}
+"""
+
+# KEYS: counter hash, global event log, user event log
+# ARGV: event..., the number of currencies paid and received, then a
+#       counter and amount for each paid and each received currency
+EXCHANGE = RECORD_EVENT + """
+local paid = tonumber(ARGV[7])
+local n = paid + tonumber(ARGV[8])
+local ok = 1
+for k = 0, paid - 1 do
+    local balance = tonumber(redis.call("HGET", KEYS[1], ARGV[9 + k * 2])
+                             or "0")
+    if balance < tonumber(ARGV[10 + k * 2]) then
+        ok = 0
+    end
+end
+if ok == 1 then
+    for k = 0, n - 1 do
+        local amount = tonumber(ARGV[10 + k * 2])
+        if k < paid then
+            amount = -amount
+        end
+        redis.call("HINCRBY", KEYS[1], ARGV[9 + k * 2], amount)
+    end
+    record_event(KEYS[2], KEYS[3], 1)
+end
+local balances = {}
+for k = 0, n - 1 do
+    balances[k + 1] = tonumber(redis.call("HGET", KEYS[1], ARGV[9 + k * 2])
+                               or "0")
+end
+return {ok, balances}
+"""
+
+# KEYS: user counter hash, bucket hash
+# ARGV: user id
+MIGRATE_COUNTERS = """
+local values = redis.call("HGETALL", KEYS[1])
+for i = 1, #values, 2 do
+    redis.call("HINCRBY", KEYS[2], ARGV[1] .. ":" .. values[i], values[i + 1])
+end
+redis.call("DEL", KEYS[1])
+return #values / 2
+"""
+
+# KEYS: user badge set, bucket hash
+# ARGV: user id
+MIGRATE_BADGES = """
+local members = redis.call("SMEMBERS", KEYS[1])
+for _, badge in ipairs(members) do
+    redis.call("HSETNX", KEYS[2], ARGV[1] .. ":" .. badge, 1)
+end
+redis.call("DEL", KEYS[1])
+return #members
+"""
+
+# KEYS: counter hash
+# ARGV: counter, "ratio" or "interval", reward, then for ratios the nth
+#       response to reward and for intervals the current time, the
+#       seconds that must have passed and the offset of the stored time
+SCHEDULE = """
+local reward = tonumber(ARGV[3])
+if ARGV[2] == "ratio" then
+    local n = redis.call("HINCRBY", KEYS[1], ARGV[1], 1)
+    if n > 0 and n % tonumber(ARGV[4]) == 0 then
+        return reward
+    end
+    return 0
+end
+local now = tonumber(ARGV[4])
+local last = tonumber(redis.call("HGET", KEYS[1], ARGV[1]) or "0")
+if now - last >= tonumber(ARGV[5]) then
+    redis.call("HSET", KEYS[1], ARGV[1], now + tonumber(ARGV[6]))
+    return reward
+end
+return 0
+"""
+
+SCRIPTS = dict(counter_add=COUNTER_ADD,
+               badge_add=BADGE_ADD,
+               spend=SPEND,
+               exchange=EXCHANGE,
+               schedule=SCHEDULE,
+               migrate_counters=MIGRATE_COUNTERS,
+               migrate_badges=MIGRATE_BADGES)
+
+
+def _sha(source):
+    return hashlib.sha1(source.encode("utf-8")).hexdigest()
+
+SHAS = dict((name, _sha(source)) for name, source in SCRIPTS.items())
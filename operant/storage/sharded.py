@@ -0,0 +1,166 @@
+"""Module for spreading users over several storage providers
+
+Users are placed on the providers by consistent hashing of their ids,
+all the data of a user, counters, badges and events, lives with the
+same provider. Adding a provider to N existing ones only moves about
+1/(N+1) of the users.
+"""
+from __future__ import (with_statement, print_function,
+                        division, absolute_import)
+import bisect
+import hashlib
+
+import zope.interface as interface
+from six import text_type
+
+import operant.data
+from operant.storage.common_redis import user_id
+
+
+def _key(user):
+    return text_type(user_id(user))
+
+
+def _hash(key):
+    return int(hashlib.md5(key.encode("utf-8")).hexdigest()[:8], 16)
+
+
+class HashRing(object):
+    """Consistent hash ring mapping keys to named nodes
+
+    Each node is placed on the ring replicas times to even out the
+    share of keys each node gets.
+    """
+
+    def __init__(self, names=(), replicas=160):
+        self.replicas = replicas
+        self._points = list()
+        self._names = list()
+        for name in names:
+            self.add(name)
+
+    def add(self, name):
+        for i in range(self.replicas):
+            point = _hash("{0}:{1}".format(name, i))
+            pos = bisect.bisect(self._points, point)
+            self._points.insert(pos, point)
+            self._names.insert(pos, name)
+
+    def remove(self, name):
+        keep = [(p, n) for p, n in zip(self._points, self._names)
+                if n != name]
+        self._points = [p for p, _ in keep]
+        self._names = [n for _, n in keep]
+
+    def get(self, key):
+        if not self._points:
+            raise LookupError("The hash ring has no nodes")
+        pos = bisect.bisect(self._points, _hash(key)) % len(self._points)
+        return self._names[pos]
+
+
+@interface.implementer(operant.data.IStorageProvider)
+class ShardedStorage(object):
+    """Storage provider spreading users over other storage providers
+
+    Takes a dict mapping node names to storage providers, typically
+    redis providers wrapping one client each. The names decide the
+    placement of users and must stay the same between runs. The
+    providers must either all record the events of awards themselves
+    or none of them.
+    """
+
+    def __init__(self, stores, replicas=160):
+        self.stores = dict(stores)
+        self._check_records(self.stores.values())
+        self.ring = HashRing(sorted(self.stores), replicas)
+
+    @staticmethod
+    def _check_records(stores):
+        if len(set(getattr(store, "records_award_events", False) is True
+                   for store in stores)) > 1:
+            raise ValueError("The providers must all record the events "
+                             "of awards or none of them")
+
+    @property
+    def records_award_events(self):
+        return any(getattr(store, "records_award_events", False) is True
+                   for store in self.stores.values())
+
+    def add_store(self, name, store):
+        """Adds a provider, users moving to it start out empty there"""
+        self._check_records(list(self.stores.values()) + [store])
+        self.stores[name] = store
+        self.ring.add(name)
+
+    def store_for(self, user):
+        """Returns the provider holding the data of the passed in user"""
+        return self.stores[self.ring.get(_key(user))]
+
+    def _many(self, items, user_of, method, target, callback):
+        """Splits a bulk call by provider and merges the results"""
+        items = list(items)
+        groups = dict()
+        for pos, item in enumerate(items):
+            name = self.ring.get(_key(user_of(item)))
+            groups.setdefault(name, list()).append(pos)
+
+        results = [None] * len(items)
+        remaining = [len(groups)]
+
+        def _merged(positions):
+            def _cb(res):
+                for pos, r in zip(positions, res):
+                    results[pos] = r
+                remaining[0] -= 1
+                if not remaining[0]:
+                    callback(results)
+            return _cb
+
+        if not groups:
+            callback(results)
+        for name, positions in groups.items():
+            getattr(self.stores[name], method)(
+                [items[pos] for pos in positions], target, _merged(positions))
+
+    def add_badge(self, user, badge, callback):
+        self.store_for(user).add_badge(user, badge, callback)
+
+    def add_badge_many(self, users, badge, callback):
+        self._many(users, lambda user: user, "add_badge_many", badge,
+                   callback)
+
+    def track_event(self, event, subject=None, ext={}):
+        self.store_for(subject).track_event(event, subject, ext)
+
+    def add_balance(self, user, currency, amount, callback):
+        self.store_for(user).add_balance(user, currency, amount, callback)
+
+    def add_balance_many(self, awards, currency, callback):
+        self._many(awards, lambda award: award[0], "add_balance_many",
+                   currency, callback)
+
+    def deduct_balance(self, user, currency, amount, callback):
+        self.store_for(user).deduct_balance(user, currency, amount, callback)
+
+    def spend_balance(self, user, currency, amount, callback):
+        self.store_for(user).spend_balance(user, currency, amount, callback)
+
+    def exchange(self, user, pay, receive, callback):
+        self.store_for(user).exchange(user, pay, receive, callback)
+
+    def respond_schedule(self, user, key, rule, callback):
+        self.store_for(user).respond_schedule(user, key, rule, callback)
+
+    def get_balance(self, user, currency, callback):
+        self.store_for(user).get_balance(user, currency, callback)
+
+    def add_points(self, user, points, amount, callback):
+        self.store_for(user).add_points(user, points, amount, callback)
+
+    def add_points_many(self, awards, points, callback):
+        self._many(awards, lambda award: award[0], "add_points_many",
+                   points, callback)
+
+    def get_points(self, user, points, callback):
+        self.store_for(user).get_points(user, points, callback)
@@ -6,48 +6,56 @@ except ImportError:
     raise ImportError("You need to install tornado-redis to"
                       "use this storage module")
 import operant.data
-from operant.storage.common_redis import mkname, user_id, RedisCommon
+from operant.storage import redis_scripts
+from operant.storage.common_redis import parse_counter, RedisCommon
 
 
 @interface.implementer(operant.data.IStorageProvider)
 class TornadoRedis(RedisCommon):
 
-    def __init__(self, client):
+    def __init__(self, client, **kwargs):
         if isinstance(client, dict):
             client = tornadoredis.Client(**client)
         self.client = client
+        super(TornadoRedis, self).__init__(**kwargs)
 
-    def add_badge(self, user, badge, callback):
+    def _badge_add(self, user, badge, callback):
         def parse(n):
-            callback(n == 1)
+            callback(self._badge_new(n))
 
-        key = mkname("badges", user_id(user))
-        self.client.sadd(key, badge.badge_id, callback=parse)
+        name, args = self._badge_cmd(user, badge.badge_id)
+        getattr(self.client, name)(*args, callback=parse)
 
-    def _add_to_ev(self, data, subject=None):
-        gkey = mkname("events")
-        pkey = mkname("events", user_id(subject))
+    def _pipeline(self, cmds, callback, transaction=False):
+        pipe = self.client.pipeline(transactional=transaction)
+        for name, args in cmds:
+            getattr(pipe, name)(*args)
+        pipe.execute(callback=callback)
 
-        pipe = self.client.pipeline()
-        pipe.lpush(gkey, data)
-        pipe.lpush(pkey, data)
-        pipe.execute(callback=lambda x: None)
+    def _eval_script(self, name, keys, args, callback):
+        sha = redis_scripts.SHAS[name]
+
+        # evalsha extends the list of keys with the args
+        def _loaded(_):
+            self.client.evalsha(sha, keys=list(keys), args=args,
+                                callback=callback)
+
+        def _evaluated(res):
+            if isinstance(res, Exception) and "NOSCRIPT" in str(res):
+                self.client.script_load(redis_scripts.SCRIPTS[name],
+                                        callback=_loaded)
+            else:
+                callback(res)
+        self.client.evalsha(sha, keys=list(keys), args=args,
+                            callback=_evaluated)
 
     def _counter_add(self, user, counter, amount, callback):
-        hash_name = mkname("counter", user_id(user))
-        self.client.hincrby(hash_name, counter,
+        hash_name, field = self._counter_location(user, counter)
+        self.client.hincrby(hash_name, field,
                             amount, callback=callback)
 
     def _counter_get(self, user, counter, callback):
         def parse(res):
-            if isinstance(res, basestring):
-                try:
-                    callback(int(res))
-                except ValueError:
-                    callback(float(res))
-            elif res is None:
-                callback(0)
-            else:
-                callback(res)
-        hash_name = mkname("counter", user_id(user))
-        self.client.hget(hash_name, counter, callback=parse)
+            callback(parse_counter(res))
+        hash_name, field = self._counter_location(user, counter)
+        self.client.hget(hash_name, field, callback=parse)
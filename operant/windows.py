@@ -0,0 +1,71 @@
+"""Calendar windows for counting points over periods of time
+
+A window is a kind of period, "day", "week" or "month". Periods are
+in UTC and labelled like 2024-03-01, 2024-W09 (ISO weeks) and 2024-03.
+"""
+from __future__ import (with_statement, print_function,
+                        division, absolute_import)
+import calendar
+import time
+from datetime import datetime, timedelta, tzinfo
+
+WINDOWS = ("day", "week", "month")
+
+try:
+    from datetime import timezone
+    _UTC = timezone.utc
+except ImportError:
+    class _Utc(tzinfo):
+        """UTC for Python 2, which lacks datetime.timezone"""
+
+        def utcoffset(self, dt):
+            return timedelta(0)
+
+        def dst(self, dt):
+            return timedelta(0)
+
+        def tzname(self, dt):
+            return "UTC"
+
+    _UTC = _Utc()
+
+
+def _epoch(dt):
+    return calendar.timegm(dt.timetuple())
+
+
+def period(window, at=None):
+    """Returns the label and end of the period containing a point in time
+
+    at is seconds since the epoch, defaulting to now. The end is in
+    seconds since the epoch and is the start of the next period.
+    """
+    if at is None:
+        at = time.time()
+    dt = datetime.fromtimestamp(at, _UTC)
+    day = datetime(dt.year, dt.month, dt.day)
+    if window == "day":
+        return day.strftime("%Y-%m-%d"), _epoch(day + timedelta(days=1))
+    elif window == "week":
+        year, week, weekday = day.isocalendar()
+        end = day + timedelta(days=8 - weekday)
+        return "{0}-W{1:02d}".format(year, week), _epoch(end)
+    elif window == "month":
+        if dt.month == 12:
+            end = datetime(dt.year + 1, 1, 1)
+        else:
+            end = datetime(dt.year, dt.month + 1, 1)
+        return day.strftime("%Y-%m"), _epoch(end)
+    raise ValueError("Unknown window {0}".format(window))
+
+
+def expiry(window, at=None, keep=1):
+    """Returns when the period containing at may be forgotten
+
+    That is the end of the period keep periods later, letting the last
+    keep periods be read back after they have ended.
+    """
+    _, end = period(window, at)
+    for _ in range(keep):
+        _, end = period(window, end)
+    return end
@@ -59,6 +59,34 @@ def test_award_fail_precond():
     badge._precondition.assert_called_once()
     callback.assert_called_once_with(False)
 
+def test_award_many():
+    ds = Mock()
+    ds.add_badge_many.side_effect = lambda users, badge, cb: cb([False, True])
+
+    badge = BadgePrototype("test.testbadge5")
+    badge._precondition = lambda user: user.operant_id() != 3
+
+    users = [Mock(), Mock(), Mock()]
+    for i, user in enumerate(users):
+        user.operant_id.return_value = i + 1
+
+    callback = Mock()
+    badge.award_many(ds, users, callback)
+
+    ds.add_badge_many.assert_called_once_with([1, 2], badge, ANY)
+    callback.assert_called_once_with([False, badge, False])
+
+def test_award_future():
+    ds = Mock()
+    ds.add_badge.side_effect = lambda user, badge, cb: cb(True)
+
+    badge = BadgePrototype("test.testbadge6")
+
+    user = Mock()
+    user.operant_id.return_value = 1010
+
+    eq_(badge.award(ds, user).result(), badge)
+
 @raises(RuntimeError)
 def test_register_existing_badge():
     b = BadgePrototype("test.testbadge3")
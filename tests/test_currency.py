@@ -2,7 +2,7 @@
 from mock import Mock, patch, ANY, sentinel
 from nose.tools import ok_, eq_, raises
 
-from operant.currency import Currency
+from operant.currency import Currency, exchange
 
 def _m_user():
     mck = Mock()
@@ -68,3 +68,62 @@ class TestCurrency(object):
 
         cb.assert_called_once_with(9)
         ds.get_balance.assert_called_once_with(1010, currency, ANY)
+
+    def test_award_many(self):
+        ds = Mock()
+        ds.add_balance_many.side_effect = lambda a, b, callback: callback([9])
+
+        currency = Currency("test.testcurrency")
+
+        cb = Mock()
+        currency.award_many(ds, [(_m_user(), 5)], cb)
+
+        cb.assert_called_once_with([9])
+        ds.add_balance_many.assert_called_once_with([(1010, 5)],
+                                                    currency, ANY)
+
+    def test_futures(self):
+        from concurrent.futures import wait
+        ds = self._ds_get_balance(9)
+        ds.add_balance.side_effect = lambda a, b, c, callback: callback(3)
+
+        currency = Currency("test.testcurrency")
+
+        futures = [currency.get_balance(ds, _m_user()),
+                   currency.award(ds, _m_user(), 2)]
+        wait(futures)
+
+        eq_([f.result() for f in futures], [9, 3])
+
+    def test_spend(self):
+        ds = Mock()
+        ds.spend_balance.side_effect = \
+            lambda a, b, c, callback: callback((True, 4))
+
+        currency = Currency("test.testcurrency")
+        cb = Mock()
+        currency.spend(ds, _m_user(), 5, cb)
+
+        cb.assert_called_once_with((True, 4))
+        ds.track_event.assert_called_once_with(
+            "currency.deducted.test.testcurrency", 1010, dict(amount=5))
+
+    def test_spend_insufficient(self):
+        ds = Mock()
+        ds.spend_balance.side_effect = \
+            lambda a, b, c, callback: callback((False, 4))
+
+        currency = Currency("test.testcurrency")
+        eq_(currency.spend(ds, _m_user(), 5).result(), (False, 4))
+        eq_(ds.track_event.call_count, 0)
+
+    def test_exchange(self):
+        ds = Mock()
+        ds.exchange.side_effect = \
+            lambda a, b, c, callback: callback((True, {}))
+
+        gold, gems = Currency("gold"), Currency("gems")
+        eq_(exchange(ds, _m_user(), [(gold, 5)], [(gems, 1)]).result(),
+            (True, {}))
+        ds.exchange.assert_called_once_with(1010, [(gold, 5)], [(gems, 1)],
+                                            ANY)
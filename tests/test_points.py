@@ -33,6 +33,14 @@ class TestAward(object):
 
         cb.assert_called_once_with(9)
 
+    def test_award_recorded_by_store(self):
+        ds = self._ds_add_points(9)
+        ds.records_award_events = True
+
+        PointSystem("test.testpoint").award(ds, _m_user(), 1, Mock())
+
+        ok_(not ds.track_event.called)
+
     def test_get(self):
         ds = Mock()
         ds.get_points.side_effect = lambda a, b, callback: callback(10)
@@ -60,3 +68,93 @@ class TestAward(object):
         point.award(ds, user, 1, cb)
 
         on_awarded.assert_called_once_with(user, 5, 1)
+
+    def test_award_many(self):
+        ds = Mock()
+        ds.add_points_many.side_effect = lambda a, b, callback: callback([3, 4])
+
+        point = PointSystem("test.testpoint")
+        on_awarded = Mock()
+        setattr(point, "on_awarded_points", on_awarded)
+
+        u1, u2 = _m_user(), _m_user()
+        cb = Mock()
+        point.award_many(ds, [(u1, 1), (u2, 2)], cb)
+
+        ds.add_points_many.assert_called_once_with([(1010, 1), (1010, 2)],
+                                                   point, ANY)
+        on_awarded.assert_any_call(u2, 4, 2)
+        cb.assert_called_once_with([3, 4])
+
+    def test_award_future(self):
+        ds = self._ds_add_points(9)
+
+        point = PointSystem("test.testpoint")
+
+        future = point.award(ds, _m_user(), 1)
+
+        eq_(future.result(), 9)
+        ds.track_event.assert_called_once()
+
+    def test_get_future_failed(self):
+        ds = Mock()
+        ds.get_points.side_effect = IOError()
+
+        point = PointSystem("test.testpoint")
+        future = point.get_count(ds, _m_user())
+
+        ok_(isinstance(future.exception(), IOError))
+
+    def test_top(self):
+        ds = Mock()
+        ds.leaderboard_top.side_effect = \
+            lambda points, n, callback: callback([(0, "1010", 9)])
+
+        point = PointSystem("test.testpoint", leaderboard=True)
+        cb = Mock()
+        point.top(ds, 1, cb)
+
+        cb.assert_called_once_with([(0, "1010", 9)])
+
+    def test_rank(self):
+        ds = Mock()
+        ds.leaderboard_rank.side_effect = \
+            lambda user, points, callback: callback(3)
+
+        point = PointSystem("test.testpoint", leaderboard=True)
+        eq_(point.rank(ds, _m_user()).result(), 3)
+        ds.leaderboard_rank.assert_called_once_with(1010, point, ANY)
+
+    def test_around(self):
+        ds = Mock()
+        ds.leaderboard_around.side_effect = \
+            lambda user, points, k, callback: callback([])
+
+        point = PointSystem("test.testpoint", leaderboard=True)
+        cb = Mock()
+        point.around(ds, _m_user(), 2, cb)
+
+        ds.leaderboard_around.assert_called_once_with(1010, point, 2, ANY)
+        cb.assert_called_once_with([])
+
+    def test_window_count(self):
+        ds = Mock()
+        ds.get_window_points.side_effect = \
+            lambda user, window, callback: callback(4)
+
+        point = PointSystem("test.testpoint", windows=("week",))
+        window = point.window("week", 0)
+        cb = Mock()
+        window.get_count(ds, _m_user(), cb)
+
+        ds.get_window_points.assert_called_once_with(1010, window, ANY)
+        eq_(window.period, "1970-W01")
+        cb.assert_called_once_with(4)
+
+    @raises(ValueError)
+    def test_window_not_counted(self):
+        PointSystem("test.testpoint").window("week")
+
+    @raises(ValueError)
+    def test_unknown_window(self):
+        PointSystem("test.testpoint", windows=("wek",))
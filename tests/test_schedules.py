@@ -2,8 +2,14 @@
 from mock import Mock, patch, ANY, sentinel
 
 from nose.tools import ok_, eq_, raises
-import collections
+from nose.plugins.skip import SkipTest
 import math
+import random
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 import operant.schedules as s
 
@@ -148,6 +154,96 @@ class TestVariableInterval(object):
         rnd.assert_called_with(20, 1)
 
 
+class TestExactVariableInterval(object):
+    @patch("operant.schedules.rnorm", return_value=19.6)
+    @patch("operant.schedules.seconds", return_value=30)
+    def test_draws_on_reward(self, sec, rnd):
+        f = s.VariableInterval(20, 1, exact=True)
+
+        # last is when the next reward is due
+        eq_(f(0), (50, 1))
+        rnd.assert_called_once_with(20, 1)
+        eq_(f(50), (None, 0))
+        eq_(f(30), (50, 1))
+        eq_(rnd.call_count, 2)
+
+    @patch("operant.schedules.rnorm", return_value=20)
+    @patch("operant.schedules.seconds", return_value=30)
+    def test_compiled(self, sec, rnd):
+        f = s.VariableInterval(20, exact=True).compile()
+        eq_(f(31), (None, 0))
+        ok_(not rnd.called)
+        eq_(f(29), (50, 1))
+
+    def test_batch(self):
+        if np is None:
+            raise SkipTest("numpy is not installed")
+        with patch("numpy.random.normal",
+                   return_value=np.array([20.2, 10.0, 5.0])):
+            f = s.VariableInterval(20, 2, exact=True)
+            last, rewards = f.calc_reward_batch(np.array([0, 40, 30]),
+                                                now=30)
+        eq_(last.tolist(), [50, 40, 35])
+        eq_(rewards.tolist(), [1, 0, 1])
+
+    def test_repr(self):
+        ok_("exact" in repr(s.VariableInterval(20, exact=True)))
+        ok_("exact" not in repr(s.VariableInterval(20)))
+
+
+class TestStoredSchedule(object):
+    def _user(self):
+        user = Mock()
+        user.operant_id.return_value = 1010
+        return user
+
+    def _store(self, reward):
+        store = Mock()
+        store.respond_schedule.side_effect = \
+            lambda user, key, rule, callback: callback(reward)
+        return store
+
+    def test_ratio(self):
+        store = self._store(2)
+        f = s.StoredSchedule(s.FixedRatio(5, reward=2), "fr")
+
+        eq_(f.calc_reward(store, self._user()).result(), 2)
+        store.respond_schedule.assert_called_once_with(
+            1010, "fr", ("ratio", 2, 5), ANY)
+
+    @patch("operant.schedules.seconds", return_value=30)
+    def test_interval(self, sec):
+        store = self._store(0)
+        f = s.StoredSchedule(s.FixedInterval(10), "fi")
+
+        eq_(f.calc_reward(store, self._user()).result(), 0)
+        store.respond_schedule.assert_called_once_with(
+            1010, "fi", ("interval", 1, 30, 10, 0), ANY)
+
+    @patch("operant.schedules.rnorm", return_value=19.6)
+    @patch("operant.schedules.seconds", return_value=30)
+    def test_variable_interval(self, sec, rnd):
+        store = self._store(1)
+        s.StoredSchedule(s.VariableInterval(20), "vi").calc_reward(
+            store, self._user(), Mock())
+        s.StoredSchedule(s.VariableInterval(20, exact=True), "vi")\
+            .calc_reward(store, self._user(), Mock())
+
+        eq_([c[0][2] for c in store.respond_schedule.call_args_list],
+            [("interval", 1, 30, 19.6, 0), ("interval", 1, 30, 0, 20)])
+
+    def test_stateless(self):
+        store = Mock()
+        f = s.StoredSchedule(s.VariableRatio(1), "vr")
+
+        eq_(f.calc_reward(store, self._user()).result(), 1)
+        ok_(not store.respond_schedule.called)
+
+    @raises(TypeError)
+    def test_combined(self):
+        s.StoredSchedule(s.FixedRatio(1) + s.FixedRatio(2), "comb")
+
+
 class TestCombined(object):
     def _mock_sched(self, ret):
         sched = Mock()
@@ -205,7 +301,7 @@ class TestCombined(object):
     def test_null_combined(self):
         comb = s.Combined([])
         ret = comb()
-        ok_(isinstance(ret, collections.Iterable))
+        ok_(isinstance(ret, s.Iterable))
         eq_(list(ret), [])
 
     def test_applying_args(self):
@@ -226,6 +322,174 @@ class TestCombined(object):
                                    bar=sentinel.bar_arg)
 
 
+class TestRandomStream(object):
+    def _streams(self):
+        yield s.RandomStream(random.Random(1), block_size=4)
+        if np is not None:
+            yield s.RandomStream(np.random.default_rng(1), block_size=4)
+
+    def test_seeded(self):
+        a, b = s.RandomStream(5), s.RandomStream(5)
+        eq_([a.uniform() for i in range(10)], [b.uniform() for i in range(10)])
+        eq_([a.normal() for i in range(10)], [b.normal() for i in range(10)])
+
+    def test_refills(self):
+        for stream in self._streams():
+            values = [stream.uniform() for i in range(10)]
+            ok_(all(1 > x >= 0 for x in values))
+            eq_(len(set(values)), 10)
+            normals = [stream.normal(100, 0.1) for i in range(10)]
+            ok_(all(99 < x < 101 for x in normals))
+
+    def test_arrays(self):
+        if np is None:
+            raise SkipTest("numpy is not installed")
+        for stream in self._streams():
+            eq_(stream.uniform_array(3).shape, (3,))
+            eq_(stream.normal_array(0, 1, (2, 3)).shape, (2, 3))
+
+    def test_variable_ratio(self):
+        stream = Mock(spec=s.RandomStream)
+        stream.uniform.return_value = 0.51
+        f = s.VariableRatio(2, rng=stream)
+        eq_(f(), 1)
+        stream.uniform.return_value = 0.2
+        eq_(f(), 0)
+
+    def test_variable_interval(self):
+        stream = Mock(spec=s.RandomStream)
+        stream.normal.return_value = 20
+        f = s.VariableInterval(20, 2, rng=stream)
+        with patch("operant.schedules.seconds", return_value=30):
+            eq_(f(10), (30, 1))
+            eq_(f(20), (None, 0))
+        stream.normal.assert_called_with(20, 2)
+
+    def test_reproducible(self):
+        def rewards():
+            f = s.VariableRatio(3, rng=42)
+            return [f() for i in range(50)]
+        eq_(rewards(), rewards())
+
+    def test_batch(self):
+        if np is None:
+            raise SkipTest("numpy is not installed")
+        f = s.VariableInterval(20, 2, rng=s.RandomStream(random.Random(3)))
+        g = s.VariableInterval(20, 2, rng=s.RandomStream(random.Random(3)))
+        last = np.arange(0, 40, 2)
+        eq_(f.calc_reward_batch(last, now=40)[1].tolist(),
+            g.calc_reward_batch(last, now=40)[1].tolist())
+
+
+class TestCompile(object):
+    def test_ratio(self):
+        f = s.FixedRatio(2, reward=3).compile()
+        eq_([f(x) for x in range(4)], [0, 0, 3, 0])
+        eq_(s.FixedRatio(1).compile()(0), 1)
+
+    @patch("operant.schedules.seconds", return_value=30)
+    def test_interval(self, sec):
+        f = s.FixedInterval(10).compile()
+        eq_(f(20), (30, 1))
+        eq_(f(25), (None, 0))
+
+    @patch("operant.schedules.runif", return_value=0.51)
+    @patch("operant.schedules.seconds", return_value=30)
+    def test_combined(self, sec, rnd):
+        comb = s.Combined(s.FixedRatio(2), s.VariableRatio(2),
+                          s.FixedInterval(10))
+        f = comb.compile()
+        eq_(f(2, 25), (1, 1, (None, 0)))
+        eq_(f(last=0, current=1), (0, 1, (30, 1)))
+
+    def test_combined_parts(self):
+        s1 = Mock(return_value=sentinel.r1)
+        s1.tracking = ["foo"]
+        s2 = Mock(return_value=sentinel.r2)
+        s2.tracking = ["foo", "bar"]
+
+        f = s.Combined(iter([s1, s2])).compile()
+
+        eq_(f(sentinel.foo, bar=sentinel.bar), (sentinel.r1, sentinel.r2))
+        s1.assert_called_once_with(foo=sentinel.foo)
+        s2.assert_called_once_with(foo=sentinel.foo, bar=sentinel.bar)
+
+    def test_nested(self):
+        comb = s.Combined(s.FixedRatio(1), s.Combined(s.FixedRatio(2)))
+        eq_(comb.compile()(current=2), (1, (1,)))
+
+    def test_null_combined(self):
+        eq_(s.Combined([]).compile()(), ())
+
+    @raises(ValueError)
+    def test_bad_name(self):
+        part = Mock()
+        part.tracking = ["no good"]
+        s.Combined(part).compile()
+
+
+class TestBatch(object):
+    def setup(self):
+        if np is None:
+            raise SkipTest("numpy is not installed")
+
+    def test_fixed_ratio(self):
+        f = s.FixedRatio(2, reward=3)
+        eq_(f.calc_reward_batch(np.arange(5)).tolist(), [0, 0, 3, 0, 3])
+        eq_(f.calc_reward_batch(current=[4]).tolist(), [3])
+
+    def test_fixed_ratio_every(self):
+        f = s.FixedRatio(1)
+        eq_(f.calc_reward_batch(np.arange(3)).tolist(), [1, 1, 1])
+
+    def test_variable_ratio(self):
+        eq_(s.VariableRatio(1).calc_reward_batch(size=4).tolist(),
+            [1, 1, 1, 1])
+        with patch("numpy.random.random_sample",
+                   return_value=np.array([0.51, 0.2])):
+            f = s.VariableRatio(2)
+            eq_(f.calc_reward_batch(size=2).tolist(), [1, 0])
+
+    @raises(ValueError)
+    def test_variable_ratio_no_size(self):
+        s.VariableRatio(2).calc_reward_batch()
+
+    @patch("operant.schedules.seconds", return_value=30)
+    def test_fixed_interval(self, sec):
+        f = s.FixedInterval(10)
+        last, rewards = f.calc_reward_batch(np.array([0, 20, 25]))
+        eq_(last.tolist(), [30, 30, 25])
+        eq_(rewards.tolist(), [1, 1, 0])
+        sec.assert_called_once_with()
+
+    def test_interval_now(self):
+        f = s.FixedInterval(10)
+        last, rewards = f.calc_reward_batch(last=[0, 5], now=10)
+        eq_(last.tolist(), [10, 5])
+        eq_(rewards.tolist(), [1, 0])
+
+    def test_variable_interval(self):
+        with patch("numpy.random.normal",
+                   return_value=np.array([20, 5])) as rnd:
+            f = s.VariableInterval(20, 2)
+            last, rewards = f.calc_reward_batch(np.array([10, 28]), now=30)
+        rnd.assert_called_once_with(20, 2, (2,))
+        eq_(last.tolist(), [30, 28])
+        eq_(rewards.tolist(), [1, 0])
+
+    @patch("operant.schedules.seconds", return_value=30)
+    def test_combined(self, sec):
+        comb = s.FixedRatio(2) + s.VariableRatio(1) + s.FixedInterval(10)
+        fr, vr, (last, fi) = comb.calc_reward_batch(
+            current=np.array([1, 2]), last=np.array([25, 0]))
+        eq_(fr.tolist(), [0, 1])
+        eq_(vr.tolist(), [1, 1])
+        eq_(last.tolist(), [25, 30])
+        eq_(fi.tolist(), [0, 1])
+        # One shared now for all the parts
+        sec.assert_called_once_with()
+
+
 class TestMisc(object):
     def test_runif(self):
         ret = s.runif()
@@ -0,0 +1,169 @@
+"""Tests for the asyncio redis storage"""
+from mock import Mock, AsyncMock, ANY
+from nose.tools import ok_, eq_
+from nose.plugins.skip import SkipTest
+
+import asyncio
+
+missing_redis = False
+try:
+    from operant.storage import asyncio_redis
+except ImportError:
+    missing_redis = True
+
+from operant.point import PointSystem
+from operant.currency import Currency
+
+
+def _m_user():
+    mck = Mock()
+    mck.operant_id.return_value = 1010
+    return mck
+
+
+class TestAsyncioRedis(object):
+
+    def setup(self):
+        if missing_redis:
+            raise SkipTest
+
+    def _run(self, coro):
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(coro)
+        finally:
+            loop.close()
+
+    def _client(self):
+        cli = Mock()
+        cli.hincrby = AsyncMock(return_value=10)
+        cli.hget = AsyncMock(return_value=b"12")
+        cli.sadd = AsyncMock(return_value=1)
+        cli.pipeline.return_value.execute = AsyncMock(return_value=[1, 1])
+        cli.aclose = AsyncMock()
+        return cli
+
+    def test_award(self):
+        cli = self._client()
+        ds = asyncio_redis.AsyncioRedis(cli)
+
+        async def award():
+            res = await PointSystem("TestPoints").award_async(ds, _m_user(), 2)
+            await ds.close()
+            return res
+
+        eq_(self._run(award()), 10)
+        cli.hincrby.assert_called_once_with("counter:1010",
+                                            "points:TestPoints", 2)
+        # The event is sent before closing
+        pipe = cli.pipeline.return_value
+        pipe.lpush.assert_any_call("events:1010", ANY)
+        pipe.execute.assert_awaited_once()
+
+    def test_get_balance(self):
+        cli = self._client()
+        ds = asyncio_redis.AsyncioRedis(cli)
+
+        async def get():
+            return await Currency("TestCurrency").get_balance_async(
+                ds, _m_user())
+
+        eq_(self._run(get()), 12)
+        cli.hget.assert_called_once_with("counter:1010",
+                                         "currency:TestCurrency")
+
+    def test_concurrent(self):
+        cli = self._client()
+        ds = asyncio_redis.AsyncioRedis(cli)
+        xp = PointSystem("TestPoints")
+
+        async def award():
+            return await asyncio.gather(*[xp.award_async(ds, _m_user())
+                                          for _ in range(100)])
+
+        eq_(self._run(award()), [10] * 100)
+
+    def test_scripted(self):
+        cli = self._client()
+        cli.evalsha = AsyncMock(side_effect=[
+            asyncio_redis.redis.exceptions.NoScriptError(), 7])
+        cli.script_load = AsyncMock()
+        ds = asyncio_redis.AsyncioRedis(cli, scripts=True)
+
+        async def award():
+            return await PointSystem("TestPoints").award_async(ds, _m_user())
+
+        eq_(self._run(award()), 7)
+        cli.script_load.assert_awaited_once()
+        eq_(cli.pipeline.call_count, 0)
+
+    def test_failure(self):
+        cli = self._client()
+        cli.hget = AsyncMock(side_effect=ConnectionError("down"))
+        ds = asyncio_redis.AsyncioRedis(cli)
+
+        async def get():
+            return await asyncio.wait_for(
+                PointSystem("TestPoints").get_count_async(ds, _m_user()), 1)
+
+        try:
+            self._run(get())
+        except ConnectionError:
+            pass
+        else:
+            ok_(False, "The failure was not passed on")
+
+    def test_errback(self):
+        cli = self._client()
+        cli.hincrby = AsyncMock(side_effect=ConnectionError("down"))
+        ds = asyncio_redis.AsyncioRedis(cli)
+        callback, errback = Mock(), Mock()
+
+        async def award():
+            PointSystem("TestPoints").award(ds, _m_user(), 1, callback,
+                                            errback=errback)
+            await ds.close()
+
+        self._run(award())
+        ok_(not callback.called)
+        ok_(isinstance(errback.call_args[0][0], ConnectionError))
+
+    def test_provider_errback(self):
+        cli = self._client()
+        cli.hincrby = AsyncMock(side_effect=ConnectionError("down"))
+        errback = Mock()
+        ds = asyncio_redis.AsyncioRedis(cli, errback=errback)
+        callback = Mock()
+
+        async def award():
+            PointSystem("TestPoints").award(ds, _m_user(), 1, callback)
+            await ds.close()
+
+        self._run(award())
+        ok_(not callback.called)
+        ok_(isinstance(errback.call_args[0][0], ConnectionError))
+
+    def test_failure_reported(self):
+        cli = self._client()
+        cli.hincrby = AsyncMock(side_effect=ConnectionError("down"))
+        ds = asyncio_redis.AsyncioRedis(cli)
+        handler, callback = Mock(), Mock()
+
+        async def award():
+            asyncio.get_event_loop().set_exception_handler(handler)
+            PointSystem("TestPoints").award(ds, _m_user(), 1, callback)
+            await ds.close()
+
+        self._run(award())
+        ok_(not callback.called)
+        ok_(isinstance(handler.call_args[0][1]["exception"],
+                       ConnectionError))
+
+    def test_close_without_aclose(self):
+        cli = self._client()
+        del cli.aclose
+        cli.close = AsyncMock()
+        ds = asyncio_redis.AsyncioRedis(cli)
+
+        self._run(ds.close())
+        cli.close.assert_awaited_once_with()
@@ -0,0 +1,221 @@
+"""Tests for the caching storage"""
+from mock import Mock, patch
+from nose.tools import ok_, eq_
+
+from operant.storage.cache import CachedStorage
+from operant.storage.memory import Memory
+from operant.point import PointSystem
+from operant.currency import Currency
+
+
+def _m_user(uid=1010):
+    mck = Mock()
+    mck.operant_id.return_value = uid
+    return mck
+
+
+def _spied_memory():
+    mem = Memory()
+    store = Mock(wraps=mem)
+    return store
+
+
+class TestCachedStorage(object):
+
+    def test_read_through(self):
+        store = _spied_memory()
+        ds = CachedStorage(store)
+        xp = PointSystem("test.xp")
+
+        eq_(xp.get_count(ds, _m_user()).result(), 0)
+        eq_(xp.get_count(ds, _m_user()).result(), 0)
+
+        eq_(store.get_points.call_count, 1)
+        eq_(ds.stats(), dict(hits=1, misses=1, size=1))
+
+    def test_award_updates(self):
+        store = _spied_memory()
+        ds = CachedStorage(store)
+        gold = Currency("test.gold")
+
+        eq_(gold.get_balance(ds, _m_user()).result(), 0)
+        gold.award(ds, _m_user(), 5).result()
+        gold.deduct_balance(ds, _m_user(), 2).result()
+
+        eq_(gold.get_balance(ds, _m_user()).result(), 3)
+        eq_(store.get_balance.call_count, 1)
+        # Tracking goes through to the store
+        eq_(len(store.events(1010)), 2)
+
+    def test_award_many_updates(self):
+        store = _spied_memory()
+        ds = CachedStorage(store)
+        xp = PointSystem("test.xp")
+
+        xp.award_many(ds, [(_m_user(1), 1), (_m_user(2), 2)]).result()
+
+        eq_(xp.get_count(ds, _m_user(2)).result(), 2)
+        eq_(store.get_points.call_count, 0)
+
+    def test_lru(self):
+        store = _spied_memory()
+        ds = CachedStorage(store, maxsize=2)
+        xp = PointSystem("test.xp")
+
+        for uid in (1, 2, 1, 3, 1):
+            xp.get_count(ds, _m_user(uid))
+
+        # 2 was evicted when 3 was added, 1 was used more recently
+        eq_(ds.stats(), dict(hits=2, misses=3, size=2))
+
+    def test_ttl(self):
+        store = _spied_memory()
+        ds = CachedStorage(store, ttl=10)
+        xp = PointSystem("test.xp")
+
+        with patch("operant.storage.cache.time.time", return_value=100):
+            xp.get_count(ds, _m_user())
+        with patch("operant.storage.cache.time.time", return_value=111):
+            xp.get_count(ds, _m_user())
+
+        eq_(store.get_points.call_count, 2)
+
+    def test_invalidate(self):
+        store = _spied_memory()
+        ds = CachedStorage(store)
+        xp = PointSystem("test.xp")
+
+        xp.get_count(ds, _m_user())
+        ds.invalidate(1010)
+        xp.get_count(ds, _m_user())
+
+        eq_(store.get_points.call_count, 2)
+
+    def test_spend_updates(self):
+        store = _spied_memory()
+        ds = CachedStorage(store)
+        gold = Currency("test.gold")
+
+        gold.award(ds, _m_user(), 5)
+        eq_(gold.spend(ds, _m_user(), 2).result(), (True, 3))
+        eq_(gold.get_balance(ds, _m_user()).result(), 3)
+        eq_(store.get_balance.call_count, 0)
+
+    def test_late_read(self):
+        store = _Deferred(Memory())
+        ds = CachedStorage(store)
+        xp = PointSystem("test.xp")
+
+        read = xp.get_count(ds, _m_user())
+        award = xp.award(ds, _m_user(), 7)
+        store.run(1)
+        eq_(award.result(), 7)
+        # The read was made before the award, its reply is not cached
+        store.run()
+        eq_(read.result(), 0)
+        eq_(xp.get_count(ds, _m_user()).result(), 7)
+        eq_(store.calls, [])
+
+    def test_late_write(self):
+        store = _Deferred(Memory())
+        ds = CachedStorage(store)
+        gold = Currency("test.gold")
+
+        gold.award(ds, _m_user(), 5)
+        gold.award(ds, _m_user(), 2)
+        store.run(1)
+        store.run(0)
+        # Which of the overlapping writes was applied last is unknown
+        balance = gold.get_balance(ds, _m_user())
+        store.run()
+        eq_(balance.result(), 7)
+        eq_(gold.get_balance(ds, _m_user()).result(), 7)
+
+    def test_batch(self):
+        store = _Deferred(Memory())
+        ds = CachedStorage(store)
+        xp = PointSystem("test.xp")
+
+        with ds.batch() as batch:
+            xp.award(batch, _m_user(), 5)
+
+        eq_(xp.get_count(ds, _m_user()).result(), 5)
+        eq_(store.calls, [])
+
+    def test_discarded_batch(self):
+        store = _Deferred(Memory())
+        ds = CachedStorage(store, maxsize=2)
+        xp = PointSystem("test.xp")
+
+        try:
+            with ds.batch() as batch:
+                xp.award(batch, _m_user(0), 5)
+                raise IOError()
+        except IOError:
+            pass
+        for uid in range(1, 500):
+            xp.award(ds, _m_user(uid), 1)
+            store.run()
+        xp.award(ds, _m_user(0), 1)
+        store.run()
+
+        ok_(len(ds._written) <= 2)
+        eq_(xp.get_count(ds, _m_user(0)).result(), 6)
+        eq_(store.calls, [])
+
+    def test_pending_write_kept(self):
+        store = _Deferred(Memory())
+        ds = CachedStorage(store, maxsize=2)
+        xp = PointSystem("test.xp")
+
+        xp.award(ds, _m_user(0), 5)
+        for uid in range(1, 10):
+            xp.award(ds, _m_user(uid), 1)
+            store.run(-1)
+
+        eq_(len(ds._written), 2)
+        store.run()
+        eq_(xp.get_count(ds, _m_user(0)).result(), 5)
+        eq_(store.calls, [])
+
+
+class _Deferred(object):
+    """Storage provider replying to calls once told to"""
+
+    def __init__(self, store):
+        self.store = store
+        self.calls = list()
+
+    def __getattr__(self, name):
+        method = getattr(self.store, name)
+
+        def _call(*args):
+            if not args or not callable(args[-1]):
+                return method(*args)
+            callback = args[-1]
+            method(*(args[:-1] + (lambda res: self.calls.append(
+                lambda: callback(res)),)))
+        return _call
+
+    def run(self, i=None):
+        """Replies to the ith pending call, or to all of them"""
+        if i is not None:
+            self.calls.pop(i)()
+            return
+        while self.calls:
+            self.calls.pop(0)()
+
+    def batch(self):
+        return _DeferredBatch(self.store)
+
+
+class _DeferredBatch(_Deferred):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.run()
+        else:
+            self.calls = list()
+        return False
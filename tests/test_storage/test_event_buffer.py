@@ -0,0 +1,109 @@
+"""Tests for the background event buffer"""
+import atexit
+import gc
+import threading
+import time
+import weakref
+
+from mock import Mock
+from nose.plugins.skip import SkipTest
+from nose.tools import eq_, ok_
+
+from operant.storage.event_buffer import EventBuffer
+
+
+class TestEventBuffer(object):
+
+    def test_flush_size(self):
+        flush = Mock()
+        buf = EventBuffer(flush, flush_size=2, flush_interval=60)
+        for i in range(4):
+            buf.put(i)
+        buf.flush()
+
+        eq_(flush.call_args_list[0][0][0], [0, 1])
+        eq_(buf.stats(), dict(flushed=4, dropped=0, queued=0))
+        buf.close()
+
+    def test_close_flushes(self):
+        flush = Mock()
+        buf = EventBuffer(flush, flush_interval=60)
+        buf.put(1)
+        buf.close()
+
+        flush.assert_called_once_with([1])
+        ok_(not buf.put(2))
+        eq_(buf.dropped, 1)
+
+    def test_drops_when_full(self):
+        release = threading.Event()
+        buf = EventBuffer(lambda items: release.wait(), maxsize=1,
+                          flush_size=1, block_timeout=0)
+        results = [buf.put(i) for i in range(4)]
+        release.set()
+        buf.close()
+
+        # The first item may or may not have been taken off the queue
+        ok_(results[:2] in ([True, True], [True, False]))
+        eq_(buf.flushed + buf.dropped, 4)
+
+    def test_failed_flush_dropped(self):
+        buf = EventBuffer(Mock(side_effect=IOError()), flush_interval=0)
+        buf.put(1)
+        buf.flush()
+
+        eq_(buf.stats(), dict(flushed=0, dropped=1, queued=0))
+        buf.close()
+
+    def test_put_while_closing(self):
+        release = threading.Event()
+        buf = EventBuffer(lambda items: release.wait(), maxsize=1,
+                          flush_size=1, block_timeout=None)
+        buf.put(0)
+        buf.put(1)
+        putter = threading.Thread(target=buf.put, args=(2,))
+        putter.start()
+        closer = threading.Thread(target=buf.close)
+        closer.start()
+        release.set()
+        putter.join()
+        closer.join()
+
+        eq_(buf.flushed + buf.dropped, 3)
+        eq_(buf.stats()["queued"], 0)
+
+    def test_concurrent_puts_wait(self):
+        release = threading.Event()
+        buf = EventBuffer(lambda items: release.wait(), maxsize=1,
+                          flush_size=1, block_timeout=0.2)
+        buf.put(0)
+        while buf.stats()["queued"]:
+            time.sleep(0.01)
+        buf.put(1)
+        waits = list()
+
+        def _put():
+            start = time.time()
+            buf.put(2)
+            waits.append(time.time() - start)
+        putters = [threading.Thread(target=_put) for _ in range(5)]
+        for putter in putters:
+            putter.start()
+        for putter in putters:
+            putter.join()
+        release.set()
+        buf.close()
+
+        ok_(max(waits) < 0.4)
+        eq_(buf.dropped, 5)
+
+    def test_close_releases(self):
+        if not hasattr(atexit, "unregister"):
+            raise SkipTest("atexit.unregister needs Python 3")
+        buf = EventBuffer(Mock(), flush_interval=60)
+        buf.close()
+        ref = weakref.ref(buf)
+        del buf
+        gc.collect()
+
+        ok_(ref() is None)
@@ -0,0 +1,42 @@
+"""Tests for the event codecs"""
+from nose.tools import eq_, ok_, raises
+from nose.plugins.skip import SkipTest
+
+from operant.storage import event_codecs
+
+
+def test_json_roundtrip():
+    codec = event_codecs.JSONCodec()
+    body = ("point.awarded.xp", 1010, dict(amount=1))
+    eq_(codec.decode(codec.encode(body)), ["point.awarded.xp", 1010,
+                                           dict(amount=1)])
+
+
+class TestMsgpackCodec(object):
+
+    def setup(self):
+        if event_codecs.msgpack is None:
+            raise SkipTest
+
+    def test_roundtrip(self):
+        codec = event_codecs.MsgpackCodec(["xp"])
+        for body in [("point.awarded.xp", 1010, dict(amount=1)),
+                     ("badge.awarded.unknown", "bob", {}),
+                     ("login", None, dict(ip="127.0.0.1")),
+                     ("point.awarded.xp", 1010, dict(amount=1), 12.5)]:
+            eq_(codec.decode(codec.encode(body)), list(body))
+
+    def test_interned(self):
+        codec = event_codecs.MsgpackCodec(["xp"])
+        data = codec.encode(("point.awarded.xp", 1010, dict(amount=1)))
+        ok_(b"xp" not in data and b"amount" not in data)
+        ok_(len(data) < len(event_codecs.JSONCodec().encode(
+            ("point.awarded.xp", 1010, dict(amount=1)))) // 3)
+
+    @raises(ValueError)
+    def test_integer_key(self):
+        event_codecs.MsgpackCodec().encode(("x", 1, {3: "y"}))
+
+    @raises(ValueError)
+    def test_duplicate_symbols(self):
+        event_codecs.MsgpackCodec(["amount"])
@@ -0,0 +1,38 @@
+"""Tests for the event rules"""
+from mock import Mock
+from nose.tools import eq_, raises
+
+from operant.storage.event_rules import EventRules
+
+
+def test_longest_prefix():
+    rules = EventRules({"point": "drop", "point.awarded.xp": "user",
+                        "currency.*": "global"})
+    eq_(rules.route("point.awarded.gold"), (False, False))
+    eq_(rules.route("point.awarded.xp"), (False, True))
+    eq_(rules.route("currency.awarded.gold"), (True, False))
+    eq_(rules.route("pointless"), (True, True))
+
+
+def test_default():
+    rules = EventRules({"*": "drop", "badge": "keep"})
+    eq_(rules.route("login"), (False, False))
+    eq_(rules.route("badge.awarded.first"), (True, True))
+
+
+def test_sample():
+    rng = Mock()
+    rng.random.side_effect = [0.05, 0.5]
+    rules = EventRules({"point.awarded": 0.1}, rng=rng)
+    eq_(rules.route("point.awarded.xp"), (True, True))
+    eq_(rules.route("point.awarded.xp"), (False, False))
+
+
+@raises(ValueError)
+def test_unknown_action():
+    EventRules({"point": "sometimes"})
+
+
+@raises(ValueError)
+def test_sample_rate():
+    EventRules({"point": 1.5})
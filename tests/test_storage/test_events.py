@@ -0,0 +1,135 @@
+"""Tests for reading back event logs"""
+from mock import Mock, call
+from nose.tools import ok_, eq_
+from nose.plugins.skip import SkipTest
+
+import json
+
+missing_redis = False
+try:
+    from operant.storage import events
+except ImportError:
+    missing_redis = True
+
+
+def _entry(i, event):
+    return ("{0}-0".format(i).encode(), {b"data": json.dumps(event)})
+
+
+class TestMerged(object):
+
+    def setup(self):
+        if missing_redis:
+            raise SkipTest
+
+    def test_merged(self):
+        lists = {
+            "p0": [json.dumps(["a", 1, {}, t]) for t in (9, 5, 1)],
+            "p1": [json.dumps(["b", 2, {}, t]) for t in (8, 7, 2)],
+        }
+        cli = _list_client(lists)
+
+        res = list(events.merged(cli, ["p0", "p1"], page=2))
+
+        eq_([ev[3] for ev in res], [9, 8, 7, 5, 2, 1])
+        cli.lrange.assert_any_call("p0", -1, -1)
+
+    def test_pushed_while_reading(self):
+        lists = {"p0": [json.dumps([name, 1, {}, t])
+                        for name, t in (("y", 2), ("x", 1))]}
+        cli = _list_client(lists)
+
+        res = events.merged(cli, ["p0"], page=1)
+        eq_(next(res)[0], "y")
+        lists["p0"].insert(0, json.dumps(["z", 1, {}, 3]))
+
+        eq_([ev[0] for ev in res], ["x"])
+
+    def test_trimmed_while_reading(self):
+        lists = {"p0": [json.dumps([name, 1, {}, t])
+                        for name, t in (("y", 3), ("x", 2), ("w", 1))]}
+        cli = _list_client(lists)
+
+        res = events.merged(cli, ["p0"], page=1, capped=True)
+        eq_(next(res)[0], "y")
+        lists["p0"].insert(0, json.dumps(["z", 1, {}, 4]))
+        lists["p0"].pop()
+
+        eq_([ev[0] for ev in res], ["x", "w"])
+        cli.lrange.assert_called_once_with("p0", 0, -1)
+
+
+def _list_client(lists):
+    """Mocks a client reading lists with the LRANGE semantics of redis"""
+    def lrange(key, start, end):
+        items = lists[key]
+        start = max(start + len(items), 0) if start < 0 else start
+        end = end + len(items) if end < 0 else end
+        return items[start:end + 1]
+    cli = Mock()
+    cli.llen.side_effect = lambda key: len(lists[key])
+    cli.lrange.side_effect = lrange
+    return cli
+
+
+class TestStreamConsumer(object):
+
+    def setup(self):
+        if missing_redis:
+            raise SkipTest
+
+    def _consumer(self, replies, **kwargs):
+        cli = Mock()
+        cli.xreadgroup.side_effect = replies
+        return cli, events.StreamConsumer(cli, "grp", "w1", **kwargs)
+
+    def test_events(self):
+        ev1 = ["point.awarded.xp", 1010, {"amount": 1}]
+        ev2 = ["badge.awarded.b", 1011, {}]
+        cli, consumer = self._consumer([
+            [[b"events", []]],  # nothing pending
+            [[b"events", [_entry(1, ev1), _entry(2, ev2)]]],
+            []
+        ])
+
+        eq_(list(consumer.events()), [ev1, ev2])
+
+        cli.xgroup_create.assert_called_once_with("events", "grp", "0",
+                                                  mkstream=True)
+        cli.xreadgroup.assert_has_calls([
+            call("grp", "w1", {"events": "0"}, count=1000, block=None),
+            call("grp", "w1", {"events": ">"}, count=1000, block=None)
+        ])
+        pipe = cli.pipeline.return_value
+        pipe.xack.assert_called_once_with(b"events", "grp", b"1-0", b"2-0")
+
+    def test_pending_first(self):
+        ev = ["point.awarded.xp", 1010, {"amount": 1}]
+        cli, consumer = self._consumer([
+            [[b"events", [_entry(1, ev)]]],
+            [[b"events", []]],
+            []
+        ])
+
+        eq_(list(consumer.events()), [ev])
+        pipe = cli.pipeline.return_value
+        pipe.xack.assert_called_once_with(b"events", "grp", b"1-0")
+
+    def test_not_acked_until_consumed(self):
+        ev = ["point.awarded.xp", 1010, {"amount": 1}]
+        cli, consumer = self._consumer([
+            [[b"events", []]],
+            [[b"events", [_entry(1, ev), _entry(2, ev)]]],
+        ])
+
+        gen = consumer.events()
+        next(gen)
+        next(gen)
+        eq_(cli.pipeline.call_count, 0)
+
+    def test_existing_group(self):
+        cli, consumer = self._consumer([[], []])
+        cli.xgroup_create.side_effect = events.redis.exceptions.ResponseError(
+            "BUSYGROUP Consumer Group name already exists")
+
+        eq_(list(consumer.events()), [])
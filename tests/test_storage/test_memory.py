@@ -0,0 +1,146 @@
+"""Tests for the in-memory storage"""
+from mock import Mock
+from nose.tools import ok_, eq_, raises
+
+import threading
+
+import operant.data
+from operant.storage.memory import Memory
+from operant.point import PointSystem
+from operant.currency import Currency, exchange
+from operant.badge import BadgePrototype
+from operant.schedules import FixedRatio, StoredSchedule
+
+
+def _m_user(uid=1010):
+    mck = Mock()
+    mck.operant_id.return_value = uid
+    return mck
+
+
+class TestMemory(object):
+
+    def test_implements(self):
+        ok_(operant.data.IStorageProvider.providedBy(Memory()))
+
+    def test_points(self):
+        ds = Memory()
+        xp = PointSystem("test.xp")
+
+        eq_(xp.get_count(ds, _m_user()).result(), 0)
+        eq_(xp.award(ds, _m_user(), 5).result(), 5)
+        eq_(xp.award(ds, _m_user(), 2).result(), 7)
+        eq_(xp.get_count(ds, _m_user()).result(), 7)
+        eq_(xp.get_count(ds, _m_user(1011)).result(), 0)
+
+        eq_(ds.events(1010)[0], ("point.awarded.test.xp", 1010,
+                                 dict(amount=2)))
+
+    def test_currency(self):
+        ds = Memory()
+        gold = Currency("test.gold")
+        gems = Currency("test.gems")
+
+        gold.award(ds, _m_user(), 10).result()
+        eq_(gold.deduct_balance(ds, _m_user(), 3).result(), 7)
+        eq_(gems.get_balance(ds, _m_user()).result(), 0)
+        eq_(gold.get_balance(ds, _m_user()).result(), 7)
+
+    def test_badges(self):
+        ds = Memory()
+        badge = BadgePrototype("test.badge")
+
+        eq_(badge.award(ds, _m_user()).result(), badge)
+        eq_(badge.award(ds, _m_user()).result(), False)
+        eq_(ds.badges(1010), ["test.badge"])
+        eq_(ds.badges(1011), [])
+        eq_(len(ds.events(1010)), 1)
+
+    def test_award_many(self):
+        ds = Memory()
+        badge = BadgePrototype("test.badge")
+        badge.award(ds, _m_user(1))
+
+        res = badge.award_many(ds, [_m_user(1), _m_user(2)]).result()
+        eq_(res, [False, badge])
+
+        xp = PointSystem("test.xp")
+        res = xp.award_many(ds, [(_m_user(1), 1), (_m_user(1), 2)]).result()
+        eq_(res, [1, 3])
+
+    def test_capped_events(self):
+        ds = Memory(max_events=3, max_user_events=2)
+        for i in range(5):
+            ds.track_event("test", 1010, dict(i=i))
+
+        eq_(len(ds.events()), 3)
+        eq_([ext["i"] for _, _, ext in ds.events(1010)], [4, 3])
+
+    def test_threads(self):
+        ds = Memory()
+        xp = PointSystem("test.xp")
+
+        def award():
+            for _ in range(1000):
+                xp.award(ds, _m_user(), 1)
+        threads = [threading.Thread(target=award) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        eq_(xp.get_count(ds, _m_user()).result(), 4000)
+
+    def test_spend(self):
+        ds = Memory()
+        gold = Currency("test.gold")
+        gold.award(ds, _m_user(), 5)
+
+        eq_(gold.spend(ds, _m_user(), 3).result(), (True, 2))
+        eq_(gold.spend(ds, _m_user(), 3).result(), (False, 2))
+        eq_(ds.events(1010)[0], ("currency.deducted.test.gold", 1010,
+                                 dict(amount=3)))
+
+    def test_stored_ratio(self):
+        ds = Memory()
+        fr = StoredSchedule(FixedRatio(2, reward=3), "fr")
+
+        eq_([fr.calc_reward(ds, _m_user()).result() for i in range(4)],
+            [0, 3, 0, 3])
+        eq_(fr.calc_reward(ds, _m_user(1011)).result(), 0)
+
+    def test_stored_interval(self):
+        ds = Memory()
+        callback = Mock()
+
+        ds.respond_schedule(1010, "fi", ("interval", 1, 100, 10, 0),
+                            callback)
+        callback.assert_called_once_with(1)
+        ds.respond_schedule(1010, "fi", ("interval", 1, 105, 10, 0),
+                            callback)
+        callback.assert_called_with(0)
+        # Stores the time the next reward is due with an offset
+        ds.respond_schedule(1010, "fi", ("interval", 1, 110, 0, 20),
+                            callback)
+        callback.assert_called_with(1)
+        ds.respond_schedule(1010, "fi", ("interval", 1, 129, 0, 20),
+                            callback)
+        callback.assert_called_with(0)
+
+    def test_exchange(self):
+        ds = Memory()
+        gold, gems = Currency("test.gold"), Currency("test.gems")
+        gold.award(ds, _m_user(), 5)
+
+        eq_(exchange(ds, _m_user(), [(gold, 4)], [(gems, 1)]).result(),
+            (True, {"test.gold": 1, "test.gems": 1}))
+        eq_(exchange(ds, _m_user(), [(gold, 4)], [(gems, 1)]).result(),
+            (False, {"test.gold": 1, "test.gems": 1}))
+        eq_(ds.events(1010)[0][0], "currency.exchanged")
+
+    @raises(ValueError)
+    def test_exchange_repeated_currency(self):
+        ds = Memory()
+        gold, gems = Currency("test.gold"), Currency("test.gems")
+        gold.award(ds, _m_user(), 100)
+        ds.exchange(1010, [(gold, 60), (gold, 60)], [(gems, 1)], Mock())
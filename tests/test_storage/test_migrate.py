@@ -0,0 +1,33 @@
+"""Tests for the bucketed layout migration"""
+from mock import Mock
+from nose.tools import eq_
+from nose.plugins.skip import SkipTest
+
+missing_redis = False
+try:
+    from operant.storage import migrate
+except ImportError:
+    missing_redis = True
+
+
+class TestMigrate(object):
+
+    def setup(self):
+        if missing_redis:
+            raise SkipTest
+
+    def test_migrate_to_buckets(self):
+        keys = {
+            "counter:*": [b"counter:1010", b"counter:b:0", b"counter:foo"],
+            "badges:*": [b"badges:3"],
+        }
+        cli = Mock()
+        cli.scan_iter.side_effect = lambda match, count: iter(keys[match])
+        cli.evalsha.return_value = 2
+
+        moved = migrate.migrate_to_buckets(cli)
+
+        eq_(moved, dict(counter=1, badges=1))
+        calls = [c[0][2:] for c in cli.evalsha.call_args_list]
+        eq_(calls, [("counter:1010", "counter:b:31", "1010"),
+                    ("badges:3", "badges:b:0", "3")])
@@ -6,6 +6,7 @@ from nose.plugins.skip import SkipTest
 import six
 
 import functools
+import json
 import inspect
 
 missing_redis = False
@@ -22,6 +23,10 @@ except ImportError:
     missing_tornado = True
 
 import operant.storage.common_redis as common_redis
+from operant.storage.event_rules import EventRules
+from operant.point import PointSystem
+from operant.badge import BadgePrototype
+from operant.currency import Currency
 
 def mock_badge(name="TestBadge"):
     m = Mock()
@@ -31,6 +36,8 @@ def mock_badge(name="TestBadge"):
 def mock_points(name="TestPoints"):
     m = Mock()
     m.points_id = name
+    m.leaderboard = False
+    m.windows = ()
     return m
 
 def mock_currency(name="TestCurrency"):
@@ -45,6 +52,17 @@ def test_redis_user_id_conv():
     ret = common_redis.user_id(1010)
     ok_(isinstance(ret, six.string_types))
 
+def test_keyslot():
+    # Values as given by CLUSTER KEYSLOT
+    eq_(common_redis.keyslot("123456789"), 12739)
+    eq_(common_redis.keyslot("foo"), 12182)
+    eq_(common_redis.keyslot("{user1000}.following"),
+        common_redis.keyslot("user1000"))
+
+def test_event_shard():
+    for slot in (0, 1010, common_redis.CLUSTER_SLOTS - 1):
+        eq_(common_redis.keyslot(common_redis.event_shard(slot)), slot)
+
 class CommonTests(object):
 
     def test_ctor(self):
@@ -69,6 +87,303 @@ class CommonTests(object):
         ])
         pipe.execute.assert_called()
 
+    def test_track_events_codec(self):
+        pipe = self._lpush_mck()
+        cli = Mock()
+        cli.pipeline.return_value = pipe
+        codec = Mock()
+        codec.encode.return_value = b"data"
+
+        ds = self.mocked_provider(cli, codec=codec)
+        ds.track_event("test_ev", 1010, {"ext": "bar"})
+
+        codec.encode.assert_called_once_with(("test_ev", 1010, {"ext": "bar"}))
+        pipe.lpush.assert_has_calls([
+            call("events", b"data"),
+            call("events:1010", b"data")
+        ])
+
+    def test_track_events_rules(self):
+        pipe = self._lpush_mck()
+        cli = Mock()
+        cli.pipeline.return_value = pipe
+        rules = EventRules({"test_ev": "user", "dropped": "drop"})
+
+        ds = self.mocked_provider(cli, event_rules=rules)
+        ds.track_event("test_ev", 1010)
+        ds.track_event("dropped", 1010)
+
+        pipe.lpush.assert_called_once_with("events:1010", ANY)
+        eq_(cli.pipeline.call_count, 1)
+
+    def test_track_events_no_subject(self):
+        pipe = self._lpush_mck()
+        cli = Mock()
+        cli.pipeline.return_value = pipe
+
+        ds = self.mocked_provider(cli)
+        ds.track_event("test_ev")
+
+        pipe.lpush.assert_called_once_with("events", ANY)
+
+    def test_scripted_award_rules(self):
+        mck = self._evalsha_mck(10)
+        rules = EventRules({"point": "global"})
+        cli = self.mocked_provider(mck, scripts=True, event_rules=rules)
+
+        cli.add_points(1010, mock_points(), 1, Mock())
+
+        eq_(self._script_args(mck.evalsha.call_args)[7], "g")
+
+    def test_track_events_capped(self):
+        pipe = self._lpush_mck()
+        cli = Mock()
+        cli.pipeline.return_value = pipe
+
+        ds = self.mocked_provider(cli, max_events=100, max_user_events=10,
+                                  user_events_ttl=3600)
+        ds.track_event("test_ev", 1010)
+
+        pipe.ltrim.assert_has_calls([
+            call("events", 0, 99),
+            call("events:1010", 0, 9)
+        ])
+        pipe.expire.assert_called_once_with("events:1010", 3600)
+
+    def test_track_events_stream(self):
+        pipe = Mock()
+        cli = Mock()
+        cli.pipeline.return_value = pipe
+
+        ds = self.mocked_provider(cli, event_log="stream", max_events=100)
+        ds.track_event("test_ev", 1010)
+
+        pipe.execute_command.assert_has_calls([
+            call("XADD", "events", "MAXLEN", "~", 100, "*", "data", ANY),
+            call("XADD", "events:1010", "*", "data", ANY)
+        ])
+        eq_(pipe.lpush.call_count, 0)
+
+    def test_track_events_cluster(self):
+        pipe = self._lpush_mck()
+        cli = Mock()
+        cli.pipeline.return_value = pipe
+
+        ds = self.mocked_provider(cli, cluster=True)
+        ds.track_event("test_ev", 1010)
+
+        shard = common_redis.event_shard(common_redis.keyslot("1010"))
+        pipe.lpush.assert_has_calls([
+            call(shard, ANY),
+            call("events:{1010}", ANY)
+        ])
+        # The shards are merged by the time of the events
+        eq_(len(json.loads(pipe.lpush.call_args_list[0][0][1])), 4)
+
+    def test_add_points_cluster(self):
+        mck = self._hincrby_mck()
+        cli = self.mocked_provider(mck, cluster=True)
+
+        callback = Mock()
+        cli.add_points(1010, mock_points(), 1, callback)
+
+        self._aoc(mck.hincrby, "counter:{1010}", "points:TestPoints", 1)
+
+    def test_track_events_partitioned(self):
+        pipe = self._lpush_mck()
+        cli = Mock()
+        cli.pipeline.return_value = pipe
+
+        ds = self.mocked_provider(cli, event_partitions=4)
+        ds.track_event("test_ev", 1010)
+
+        part = common_redis.keyslot("1010") % 4
+        pipe.lpush.assert_has_calls([
+            call("events:partition:{0}".format(part), ANY),
+            call("events:1010", ANY)
+        ])
+        ok_("events:partition:{0}".format(part) in ds.global_event_keys())
+
+    def test_track_events_round_robin(self):
+        pipe = self._lpush_mck()
+        cli = Mock()
+        cli.pipeline.return_value = pipe
+
+        ds = self.mocked_provider(cli, event_partitions=2,
+                                  partition_by="round_robin")
+        for _ in range(4):
+            ds.track_event("test_ev", 1010)
+
+        keys = [c[1][0] for c in pipe.lpush.mock_calls
+                if c[1][0] != "events:1010"]
+        eq_(keys, ["events:partition:0", "events:partition:1"] * 2)
+
+    @raises(ValueError)
+    def test_partitioned_cluster(self):
+        self.mocked_provider(Mock(), cluster=True, event_partitions=2)
+
+    def test_add_points_bucketed(self):
+        mck = self._hincrby_mck()
+        cli = self.mocked_provider(mck, layout="bucketed")
+
+        callback = Mock()
+        cli.add_points(1010, mock_points(), 1, callback)
+
+        # 1010 // 32 == 31
+        self._aoc(mck.hincrby, "counter:b:31", "1010:points:TestPoints", 1)
+
+    def test_add_badge_bucketed_scripted(self):
+        mck = self._evalsha_mck(1)
+        cli = self.mocked_provider(mck, scripts=True, layout="bucketed",
+                                   bucket_size=100)
+
+        callback = Mock()
+        cli.add_badge(1010, mock_badge(), callback)
+
+        callback.assert_called_once_with(True)
+        eq_(self._script_keys(mck.evalsha.call_args)[0], "badges:b:10")
+
+    @raises(ValueError)
+    def test_bucketed_non_int_user(self):
+        cli = self.mocked_provider(Mock(), layout="bucketed")
+        cli.add_points("foo", mock_points(), 1, Mock())
+
+    @raises(ValueError)
+    def test_bucketed_cluster(self):
+        self.mocked_provider(Mock(), cluster=True, layout="bucketed")
+
+    def test_add_badge_bitmap_scripted(self):
+        mck = self._evalsha_mck(1)
+        cli = self.mocked_provider(mck, scripts=True, badge_layout="bitmap")
+
+        callback = Mock()
+        cli.add_badge(1010, mock_badge(), callback)
+
+        callback.assert_called_once_with(True)
+        eq_(self._script_keys(mck.evalsha.call_args)[0], "badge:TestBadge")
+
+    def test_badge_holders(self):
+        mck = self._pipeline_mck([[5]])
+        cli = self.mocked_provider(mck, badge_layout="bitmap")
+
+        callback = Mock()
+        cli.badge_holders(mock_badge(), callback)
+
+        mck.pipeline.return_value.bitcount.assert_called_once_with(
+            "badge:TestBadge")
+        callback.assert_called_once_with(5)
+
+    def test_count_badge_holders(self):
+        mck = self._pipeline_mck([[1, 2, 1]])
+        cli = self.mocked_provider(mck, badge_layout="bitmap")
+
+        callback = Mock()
+        cli.count_badge_holders([mock_badge("a"), mock_badge("b")], "and",
+                                callback)
+
+        pipe = mck.pipeline.return_value
+        args = pipe.bitop.call_args[0]
+        eq_(args[0], "AND")
+        eq_(args[2:], ("badge:a", "badge:b"))
+        pipe.delete.assert_called_once_with(args[1])
+        callback.assert_called_once_with(2)
+
+    @raises(ValueError)
+    def test_badge_holders_needs_bitmap(self):
+        cli = self.mocked_provider(Mock())
+        cli.badge_holders(mock_badge(), Mock())
+
+    def test_add_points_leaderboard(self):
+        mck = self._pipeline_mck([[10, 10.0]])
+        cli = self.mocked_provider(mck)
+
+        callback = Mock()
+        cli.add_points(1010, PointSystem("xp", leaderboard=True), 1,
+                       callback)
+
+        pipe = mck.pipeline.return_value
+        pipe.execute_command.assert_called_once_with(
+            "ZINCRBY", "leaderboard:xp", 1, "1010")
+        callback.assert_called_once_with(10)
+
+    def test_add_points_leaderboard_scripted(self):
+        mck = self._evalsha_mck(10)
+        cli = self.mocked_provider(mck, scripts=True)
+
+        cli.add_points(1010, PointSystem("xp", leaderboard=True), 1, Mock())
+
+        eq_(self._script_keys(mck.evalsha.call_args)[-1], "leaderboard:xp")
+
+    def test_leaderboard_top(self):
+        mck = self._pipeline_mck([[[(b"3", 130.0), (b"9", 90.0)]]])
+        cli = self.mocked_provider(mck)
+
+        callback = Mock()
+        cli.leaderboard_top(PointSystem("xp", leaderboard=True), 2, callback)
+
+        mck.pipeline.return_value.zrevrange.assert_called_once_with(
+            "leaderboard:xp", 0, 1, True)
+        callback.assert_called_once_with([(0, "3", 130), (1, "9", 90)])
+
+    def test_leaderboard_top_none(self):
+        mck = Mock()
+        cli = self.mocked_provider(mck)
+
+        callback = Mock()
+        cli.leaderboard_top(PointSystem("xp", leaderboard=True), 0, callback)
+
+        callback.assert_called_once_with([])
+        ok_(not mck.pipeline.called)
+
+    def test_leaderboard_around(self):
+        mck = self._pipeline_mck([[1], [[(b"3", 130.0), (b"9", 90.0),
+                                         (b"8", 80.0)]]])
+        cli = self.mocked_provider(mck)
+
+        callback = Mock()
+        cli.leaderboard_around(9, PointSystem("xp", leaderboard=True), 2,
+                               callback)
+
+        mck.pipeline.return_value.zrevrange.assert_called_once_with(
+            "leaderboard:xp", 0, 3, True)
+        callback.assert_called_once_with([(0, "3", 130), (1, "9", 90),
+                                          (2, "8", 80)])
+
+    def test_add_points_windowed(self):
+        mck = self._pipeline_mck([[10, 10, 1]])
+        cli = self.mocked_provider(mck)
+
+        point = PointSystem("xp", windows=("day",))
+        with patch("time.time", return_value=0):
+            cli.add_points(1010, point, 1, Mock())
+
+        pipe = mck.pipeline.return_value
+        pipe.hincrby.assert_called_with("window:xp:day:1970-01-01", "1010", 1)
+        # Kept for a day after it ends
+        pipe.expireat.assert_called_once_with("window:xp:day:1970-01-01",
+                                              2 * 86400)
+
+    def test_get_window_points(self):
+        mck = self._pipeline_mck([[b"7"]])
+        cli = self.mocked_provider(mck)
+
+        callback = Mock()
+        window = PointSystem("xp", windows=("month",)).window("month", 0)
+        cli.get_window_points(1010, window, callback)
+
+        mck.pipeline.return_value.hget.assert_called_once_with(
+            "window:xp:month:1970-01", "1010")
+        callback.assert_called_once_with(7)
+
+    @raises(ValueError)
+    def test_leaderboard_missing(self):
+        cli = self.mocked_provider(Mock())
+        cli.leaderboard_top(PointSystem("xp"), 10, Mock())
+
+    @raises(ValueError)
+    def test_unknown_event_log(self):
+        self.mocked_provider(Mock(), event_log="foo")
+
     def test_add_badge(self):
         mck = self._sadd_mck(1)
         cli = self.mocked_provider(mck)
@@ -81,6 +396,9 @@ class CommonTests(object):
         self._aoc(mck.sadd, "badges:1010", "TestBadge")
 
         callback.assert_called_once_with(True)
+        # The store records the event itself
+        ok_(cli.records_award_events)
+        mck.pipeline.return_value.lpush.assert_any_call("events", ANY)
 
     def test_add_badge_existing(self):
         mck = self._sadd_mck(0)
@@ -177,6 +495,236 @@ class CommonTests(object):
         self._aoc(mck.hincrby, "counter:1010", "currency:TestCurrency", -5)
         callback.assert_called_once_with(10)
 
+    def test_add_points_scripted(self):
+        mck = self._evalsha_mck(10)
+        cli = self.mocked_provider(mck, scripts=True)
+
+        callback = Mock()
+        cli.add_points(1010, mock_points(), 1, callback)
+
+        callback.assert_called_once_with(10)
+        eq_(mck.evalsha.call_count, 1)
+        eq_(mck.hincrby.call_count, 0)
+
+    def test_scripted_award_tracks_once(self):
+        mck = self._evalsha_mck(10)
+        ds = self.mocked_provider(mck, scripts=True)
+
+        user = Mock()
+        user.operant_id.return_value = 1010
+
+        callback = Mock()
+        PointSystem("TestPoints").award(ds, user, 1, callback)
+
+        callback.assert_called_once_with(10)
+        # The event was pushed by the script
+        eq_(mck.pipeline.call_count, 0)
+
+    def test_scripted_cluster_single_slot(self):
+        mck = self._evalsha_mck(10)
+        cli = self.mocked_provider(mck, scripts=True, cluster=True)
+
+        cli.add_points(1010, mock_points(), 1, Mock())
+
+        keys = self._script_keys(mck.evalsha.call_args)
+        eq_(len(set(common_redis.keyslot(k) for k in keys)), 1)
+
+    def test_add_badge_scripted(self):
+        mck = self._evalsha_mck(1)
+        cli = self.mocked_provider(mck, scripts=True)
+
+        callback = Mock()
+        cli.add_badge(1010, mock_badge(), callback)
+
+        callback.assert_called_once_with(True)
+        eq_(mck.sadd.call_count, 0)
+
+    def test_add_badge_scripted_existing(self):
+        mck = self._evalsha_mck(0)
+        cli = self.mocked_provider(mck, scripts=True)
+
+        callback = Mock()
+        cli.add_badge(1010, mock_badge(), callback)
+
+        callback.assert_called_once_with(False)
+
+    def test_spend_balance(self):
+        mck = self._evalsha_mck([1, 6])
+        cli = self.mocked_provider(mck)
+
+        callback = Mock()
+        cli.spend_balance(1010, mock_currency(), 4, callback)
+
+        callback.assert_called_once_with((True, 6))
+        eq_(self._script_keys(mck.evalsha.call_args)[0], "counter:1010")
+        eq_(self._script_args(mck.evalsha.call_args)[:2],
+            ["currency:TestCurrency", 4])
+
+    def test_spend_balance_insufficient(self):
+        mck = self._evalsha_mck([0, 3])
+        cli = self.mocked_provider(mck)
+
+        callback = Mock()
+        cli.spend_balance(1010, mock_currency(), 4, callback)
+
+        callback.assert_called_once_with((False, 3))
+
+    def test_exchange(self):
+        mck = self._evalsha_mck([1, [1, 2]])
+        cli = self.mocked_provider(mck)
+
+        callback = Mock()
+        cli.exchange(1010, [(mock_currency("gold"), 5)],
+                     [(mock_currency("gems"), 2)], callback)
+
+        callback.assert_called_once_with((True, {"gold": 1, "gems": 2}))
+        eq_(self._script_args(mck.evalsha.call_args)[6:],
+            [1, 1, "currency:gold", 5, "currency:gems", 2])
+
+    @raises(ValueError)
+    def test_exchange_repeated_currency(self):
+        self.mocked_provider(Mock()).exchange(
+            1010, [(mock_currency("gold"), 60), (mock_currency("gold"), 60)],
+            [(mock_currency("gems"), 1)], Mock())
+
+    @raises(ValueError)
+    def test_spend_negative(self):
+        self.mocked_provider(Mock()).spend_balance(
+            1010, mock_currency(), -1, Mock())
+
+    def test_respond_schedule(self):
+        mck = self._evalsha_mck(5)
+        cli = self.mocked_provider(mck)
+
+        callback = Mock()
+        cli.respond_schedule(1010, "daily", ("interval", 5, 100, 60, 0),
+                             callback)
+
+        callback.assert_called_once_with(5)
+        eq_(self._script_keys(mck.evalsha.call_args)[0], "counter:1010")
+        eq_(self._script_args(mck.evalsha.call_args),
+            ["schedule:daily", "interval", 5, 100, 60, 0])
+
+    @raises(ValueError)
+    def test_respond_schedule_unknown(self):
+        self.mocked_provider(Mock()).respond_schedule(
+            1010, "daily", ("poisson", 1), Mock())
+
+    def test_batch_spend(self):
+        mck = self._pipeline_mck([[[1, 6]]])
+        cli = self.mocked_provider(mck)
+
+        callback = Mock()
+        with cli.batch() as batch:
+            batch.spend_balance(1010, mock_currency(), 4, callback)
+
+        args = mck.pipeline.return_value.execute_command.call_args[0]
+        eq_(args[0], "EVAL")
+        callback.assert_called_once_with((True, 6))
+
+    def test_add_points_many(self):
+        # Three commands per award: the HINCRBY and two event pushes
+        mck = self._pipeline_mck([[10, 1, 1, 20, 1, 1], [30, 1, 1]])
+        cli = self.mocked_provider(mck, chunk_size=2)
+
+        callback = Mock()
+        cli.add_points_many([(1010, 1), (1011, 2), (1012, 3)],
+                            mock_points(), callback)
+
+        callback.assert_called_once_with([10, 20, 30])
+        eq_(mck.pipeline.call_count, 2)
+        pipe = mck.pipeline.return_value
+        pipe.hincrby.assert_has_calls([
+            call("counter:1010", "points:TestPoints", 1),
+            call("counter:1011", "points:TestPoints", 2),
+            call("counter:1012", "points:TestPoints", 3)
+        ])
+        pipe.lpush.assert_any_call("events:1012", ANY)
+
+    def test_add_badge_many(self):
+        mck = self._pipeline_mck([[1, 0], [1, 1]])
+        cli = self.mocked_provider(mck)
+
+        callback = Mock()
+        cli.add_badge_many([1010, 1011], mock_badge(), callback)
+
+        callback.assert_called_once_with([True, False])
+        pipe = mck.pipeline.return_value
+        # Only the new badge is tracked
+        pipe.lpush.assert_has_calls([
+            call("events", ANY),
+            call("events:1010", ANY)
+        ])
+        eq_(pipe.lpush.call_count, 2)
+
+    def test_batch(self):
+        mck = self._pipeline_mck([[9, 1, 1, "4"]])
+        ds = self.mocked_provider(mck)
+
+        user = Mock()
+        user.operant_id.return_value = 1010
+
+        calls = list()
+        with ds.batch() as b:
+            PointSystem("TestPoints").award(b, user, 1, calls.append)
+            b.get_balance(1010, mock_currency(), calls.append)
+            eq_(mck.pipeline.call_count, 0)
+
+        eq_(calls, [9, 4])
+        # The award event went out in the same pipeline
+        eq_(mck.pipeline.call_count, 1)
+        pipe = mck.pipeline.return_value
+        pipe.hincrby.assert_called_once_with("counter:1010",
+                                             "points:TestPoints", 1)
+        pipe.hget.assert_called_once_with("counter:1010",
+                                          "currency:TestCurrency")
+
+    def test_batch_awards(self):
+        mck = self._pipeline_mck([[10, 1, 1, 5, 1, 1, [1, 3], 1]])
+        ds = self.mocked_provider(mck)
+
+        user = Mock()
+        user.operant_id.return_value = 1010
+        gold = Currency("TestCurrency")
+
+        calls = list()
+        with ds.batch() as b:
+            PointSystem("TestPoints").award(b, user, 1, calls.append)
+            gold.award(b, user, 5, calls.append)
+            gold.spend(b, user, 2, calls.append)
+            BadgePrototype("TestBadge").award(b, user, calls.append)
+
+        eq_(calls[:3], [10, 5, (True, 3)])
+        ok_(calls[3])
+        # The badge event is recorded by the script in the same pipeline
+        eq_(mck.pipeline.call_count, 1)
+        evals = mck.pipeline.return_value.execute_command.call_args_list
+        eq_([c[0][0] for c in evals], ["EVAL", "EVAL"])
+
+    def test_batch_callback_calls(self):
+        mck = self._pipeline_mck([["4"], [1, 1]])
+        ds = self.mocked_provider(mck)
+
+        def _cb(balance):
+            b.track_event("checked", 1010)
+        with ds.batch() as b:
+            b.get_balance(1010, mock_currency(), _cb)
+
+        # Calls from callbacks go out in a following pipeline
+        eq_(mck.pipeline.call_count, 2)
+
+    def test_batch_discarded_on_error(self):
+        mck = self._pipeline_mck([])
+        ds = self.mocked_provider(mck)
+
+        try:
+            with ds.batch() as b:
+                b.get_balance(1010, mock_currency(), Mock())
+                raise ValueError()
+        except ValueError:
+            pass
+        eq_(mck.pipeline.call_count, 0)
+
 class TestRedis(CommonTests):
     client_class = "redis.StrictRedis"
 
@@ -184,10 +732,10 @@ class TestRedis(CommonTests):
         if missing_redis:
             raise SkipTest
 
-    def mocked_provider(self, mock):
+    def mocked_provider(self, mock, **kwargs):
         if missing_redis:
             raise SkipTest
-        return plain_redis.Redis(mock)
+        return plain_redis.Redis(mock, **kwargs)
 
     def _sadd_mck(self, ret=1):
         mck = Mock()
@@ -213,6 +761,60 @@ class TestRedis(CommonTests):
         mck.lpush.return_value = ret
         return mck
 
+    def _evalsha_mck(self, ret=10):
+        mck = Mock()
+        mck.evalsha.return_value = ret
+        return mck
+
+    def _pipeline_mck(self, replies):
+        mck = Mock()
+        mck.pipeline.return_value.execute.side_effect = replies
+        return mck
+
+    def _script_keys(self, args):
+        (sha, numkeys) = args[0][:2]
+        return args[0][2:2 + numkeys]
+
+    def _script_args(self, args):
+        (sha, numkeys) = args[0][:2]
+        return list(args[0][2 + numkeys:])
+
+    def test_add_badge_bitmap(self):
+        mck = Mock()
+        mck.setbit.side_effect = [0, 1]
+        cli = self.mocked_provider(mck, badge_layout="bitmap")
+
+        callback = Mock()
+        cli.add_badge(1010, mock_badge(), callback)
+        cli.add_badge(1010, mock_badge(), callback)
+
+        mck.setbit.assert_called_with("badge:TestBadge", 1010, 1)
+        eq_(callback.call_args_list, [call(True), call(False)])
+
+    def test_track_events_buffered(self):
+        mck = Mock()
+        ds = self.mocked_provider(mck, event_buffer=dict(flush_interval=60))
+        ds.track_event("test_ev", 1010)
+        ds.track_event("test_ev", 1011)
+        ds.close()
+
+        eq_(mck.pipeline.call_count, 1)
+        pipe = mck.pipeline.return_value
+        eq_(pipe.lpush.call_count, 4)
+        eq_(ds.event_buffer.stats()["flushed"], 2)
+
+    def test_script_loaded_on_noscript(self):
+        mck = Mock()
+        mck.evalsha.side_effect = [
+            plain_redis.redis.exceptions.NoScriptError(), 10]
+        cli = self.mocked_provider(mck, scripts=True)
+
+        callback = Mock()
+        cli.add_points(1010, mock_points(), 1, callback)
+
+        eq_(mck.script_load.call_count, 1)
+        callback.assert_called_once_with(10)
+
 
 class TestTornadoRedis(CommonTests):
     client_class = "tornadoredis.Client"
@@ -227,10 +829,10 @@ class TestTornadoRedis(CommonTests):
             kwargs["callback"] = ANY
         m.assert_called_once_with(*args, **kwargs)
 
-    def mocked_provider(self, mock):
+    def mocked_provider(self, mock, **kwargs):
         if missing_tornado:
             raise SkipTest
-        return tornado_redis.TornadoRedis(mock)
+        return tornado_redis.TornadoRedis(mock, **kwargs)
 
     def _sadd_mck(self, ret=1):
         def _sadd(key, item, callback=None):
@@ -260,3 +862,45 @@ class TestTornadoRedis(CommonTests):
         mck = Mock()
         mck.lpush.side_effect = _lpush
         return mck
+
+    def _evalsha_mck(self, ret=10):
+        def _evalsha(sha, keys=None, args=None, callback=None):
+            callback(ret)
+        mck = Mock()
+        mck.evalsha.side_effect = _evalsha
+        return mck
+
+    def _pipeline_mck(self, replies):
+        replies = iter(replies)
+
+        def _execute(callback=None):
+            callback(next(replies))
+        mck = Mock()
+        mck.pipeline.return_value.execute.side_effect = _execute
+        return mck
+
+    def _script_keys(self, args):
+        return args[1]["keys"]
+
+    def _script_args(self, args):
+        return args[1]["args"]
+
+    def test_script_reloaded(self):
+        replies = iter([Exception("NOSCRIPT No matching script"), 3])
+        sent = list()
+
+        def _evalsha(sha, keys=None, args=None, callback=None):
+            keys.extend(args)
+            sent.append(list(keys))
+            callback(next(replies))
+        mck = Mock()
+        mck.evalsha.side_effect = _evalsha
+        mck.script_load.side_effect = lambda script, callback=None: \
+            callback("sha")
+        cli = self.mocked_provider(mck)
+
+        callback = Mock()
+        cli._eval_script("spend", ["a"], [1], callback)
+
+        callback.assert_called_once_with(3)
+        eq_(sent, [["a", 1], ["a", 1]])
@@ -0,0 +1,87 @@
+"""Tests for the sharded storage"""
+from mock import Mock
+from nose.tools import ok_, eq_, raises
+
+from operant.storage.sharded import HashRing, ShardedStorage
+from operant.storage.memory import Memory
+from operant.point import PointSystem
+
+
+def _m_user(uid=1010):
+    mck = Mock()
+    mck.operant_id.return_value = uid
+    return mck
+
+
+class TestHashRing(object):
+
+    def test_spread(self):
+        ring = HashRing(["a", "b", "c", "d"])
+        counts = dict()
+        for i in range(4000):
+            node = ring.get(str(i))
+            counts[node] = counts.get(node, 0) + 1
+
+        eq_(sorted(counts), ["a", "b", "c", "d"])
+        ok_(all(600 < n < 1400 for n in counts.values()))
+
+    def test_adding_moves_few(self):
+        ring = HashRing(["a", "b", "c", "d"])
+        before = [ring.get(str(i)) for i in range(4000)]
+        ring.add("e")
+        after = [ring.get(str(i)) for i in range(4000)]
+
+        moved = [(b, a) for b, a in zip(before, after) if b != a]
+        # Keys only move to the new node, about a fifth of them
+        ok_(all(a == "e" for _, a in moved))
+        ok_(400 < len(moved) < 1200)
+
+    def test_remove(self):
+        ring = HashRing(["a", "b"])
+        ring.remove("a")
+        eq_(set(ring.get(str(i)) for i in range(100)), set(["b"]))
+
+    @raises(LookupError)
+    def test_empty(self):
+        HashRing().get("foo")
+
+
+class TestShardedStorage(object):
+
+    def _storage(self):
+        stores = dict(a=Memory(), b=Memory(), c=Memory())
+        return stores, ShardedStorage(stores)
+
+    def test_user_on_one_store(self):
+        stores, ds = self._storage()
+        xp = PointSystem("test.xp")
+
+        for uid in range(20):
+            xp.award(ds, _m_user(uid), uid).result()
+
+        for uid in range(20):
+            owner = ds.store_for(uid)
+            eq_(xp.get_count(ds, _m_user(uid)).result(), uid)
+            eq_(xp.get_count(owner, _m_user(uid)).result(), uid)
+            # The event is kept with the counter
+            eq_(len(owner.events(uid)), 1)
+
+    @raises(ValueError)
+    def test_mixed_event_recording(self):
+        recording = Mock()
+        recording.records_award_events = True
+        ShardedStorage(dict(a=Memory(), b=recording))
+
+    def test_award_many(self):
+        stores, ds = self._storage()
+        xp = PointSystem("test.xp")
+
+        res = xp.award_many(ds, [(_m_user(uid), uid)
+                                 for uid in range(20)]).result()
+
+        eq_(res, list(range(20)))
+        eq_(sum(len(s.events()) for s in stores.values()), 20)
+
+    def test_award_many_empty(self):
+        _, ds = self._storage()
+        eq_(PointSystem("test.xp").award_many(ds, []).result(), [])
@@ -0,0 +1,36 @@
+"""Tests for the calendar windows"""
+import calendar
+
+from nose.tools import eq_, raises
+
+from operant import windows
+
+
+def _at(*args):
+    return calendar.timegm(args + (0,) * (6 - len(args)))
+
+
+def test_period_day():
+    eq_(windows.period("day", _at(2024, 2, 29, 13)),
+        ("2024-02-29", _at(2024, 3, 1)))
+
+
+def test_period_week():
+    # 2026-12-31 is a Thursday in ISO week 53
+    eq_(windows.period("week", _at(2026, 12, 31, 23)),
+        ("2026-W53", _at(2027, 1, 4)))
+
+
+def test_period_month():
+    eq_(windows.period("month", _at(2024, 12, 5)),
+        ("2024-12", _at(2025, 1, 1)))
+
+
+def test_expiry():
+    eq_(windows.expiry("month", _at(2024, 1, 31), keep=2), _at(2024, 4, 1))
+    eq_(windows.expiry("day", _at(2024, 1, 31), keep=0), _at(2024, 2, 1))
+
+
+@raises(ValueError)
+def test_unknown_window():
+    windows.period("year")